@@ -0,0 +1,105 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed instead of being queued for inference."""
+
+    def __init__(self, retry_after, reason):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bounds in-flight and queued inference work inside one worker process.
+
+    Requests wait for one of ``max_concurrency`` inference slots. A new request
+    is rejected up front when the queue is already ``max_queue_depth`` deep or
+    when the estimated wait (queue position times the recent service time)
+    exceeds ``max_wait``, so accepted requests keep a bounded latency.
+    """
+
+    def __init__(self, max_concurrency=1, max_queue_depth=8, max_wait=5.0, ewma_alpha=0.2, initial_service_time=0.5):
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_wait = max_wait
+        self.ewma_alpha = ewma_alpha
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._service_time = initial_service_time
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self):
+        return self.queued + self.in_flight
+
+    def _estimated_wait(self):
+        # Everyone ahead of us (queued plus running) drains through the slots
+        # at roughly the recent per-request service time.
+        return self.queue_depth * self._service_time / self.max_concurrency
+
+    def estimated_wait(self):
+        with self._lock:
+            return self._estimated_wait()
+
+    def _reject(self, wait, reason):
+        self.rejected += 1
+        return Overloaded(max(1, math.ceil(wait)), reason)
+
+    @contextmanager
+    def admit(self):
+        with self._lock:
+            wait = self._estimated_wait()
+            if self.queued >= self.max_queue_depth:
+                raise self._reject(wait, f"queue depth {self.queued} at limit {self.max_queue_depth}")
+            if wait > self.max_wait:
+                raise self._reject(wait, f"estimated wait {wait:.2f}s exceeds {self.max_wait:.2f}s")
+            self.queued += 1
+
+        acquired = self._slots.acquire(timeout=self.max_wait)
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                raise self._reject(self._estimated_wait(), "timed out waiting for an inference slot")
+            self.in_flight += 1
+            self.admitted += 1
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.in_flight -= 1
+                self._service_time += self.ewma_alpha * (elapsed - self._service_time)
+            self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'queued': self.queued,
+                'in_flight': self.in_flight,
+                'max_concurrency': self.max_concurrency,
+                'max_queue_depth': self.max_queue_depth,
+                'max_wait_seconds': self.max_wait,
+                'service_time_seconds': round(self._service_time, 4),
+                'estimated_wait_seconds': round(self._estimated_wait(), 4),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
+
+def controller_from_env():
+    return AdmissionController(
+        max_concurrency=int(os.environ.get('ADMISSION_MAX_CONCURRENCY', 1)),
+        max_queue_depth=int(os.environ.get('ADMISSION_MAX_QUEUE_DEPTH', 8)),
+        max_wait=float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', 5.0)),
+    )
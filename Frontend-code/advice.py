@@ -0,0 +1,97 @@
+import logging
+import math
+import os
+
+from metrics import stage
+
+ADVICE_THRESHOLD = 0.2  # Switch to the treatment advice and nearby hospitals
+
+CARE_INSIGHTS = [
+    "**Get Plenty of Rest:** Your body needs energy to fight infection.",
+    "**Stay Hydrated:** Fluids help loosen mucus and prevent dehydration.",
+    "**Follow Medical Advice:** Take all medications as prescribed by your doctor.",
+    "**Manage Symptoms:** Consult a doctor about over-the-counter symptom relief.",
+]
+PREVENTION_INSIGHTS = [
+    "**Practice Good Hygiene:** Wash hands frequently.",
+    "**Avoid Smoking:** Smoking damages your lungs.",
+    "**Get Vaccinated:** Ask your doctor about pneumonia and flu vaccines.",
+    "**Maintain a Healthy Lifestyle:** A balanced diet and exercise boost your immune system.",
+]
+
+# --- Geolocation Helpers ---
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371  # Radius of Earth in kilometers
+    dLat = math.radians(lat2 - lat1)
+    dLon = math.radians(lon2 - lon1)
+    a = (math.sin(dLat / 2) * math.sin(dLat / 2) +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dLon / 2) * math.sin(dLon / 2))
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    distance = R * c
+    return distance
+
+OVERPASS_URL = os.environ.get('OVERPASS_URL', "https://overpass-api.de/api/interpreter")
+
+def find_nearby_places(user_lat, user_lon, amenity):
+    import requests  # only needed once a result calls for facility lookups
+    overpass_url = OVERPASS_URL
+    overpass_query = f"""
+    [out:json];
+    (
+      node(around:20000,{user_lat},{user_lon})["amenity"="{amenity}"];
+      way(around:20000,{user_lat},{user_lon})["amenity"="{amenity}"];
+      relation(around:20000,{user_lat},{user_lon})["amenity"="{amenity}"];
+    );
+    out center;
+    """
+    try:
+        with stage(f"overpass_{amenity}"):
+            response = requests.post(overpass_url, data={'data': overpass_query}, timeout=10) # Added timeout
+        response.raise_for_status()
+        data = response.json()
+        
+        places = {} # Use a dict to handle duplicates
+        for element in data['elements']:
+            if 'tags' in element and 'name' in element['tags']:
+                name = element['tags']['name']
+                if name not in places:
+                    lat = element.get('lat') or element.get('center', {}).get('lat')
+                    lon = element.get('lon') or element.get('center', {}).get('lon')
+                    if lat and lon:
+                        distance = haversine(user_lat, user_lon, lat, lon)
+                        address_tags = element.get('tags', {})
+                        address_parts = [
+                            address_tags.get('addr:housenumber'),
+                            address_tags.get('addr:street'),
+                            address_tags.get('addr:city')
+                        ]
+                        address = ", ".join(filter(None, address_parts))
+                        if not address:
+                            address = f"{lat:.4f}, {lon:.4f}"
+                        
+                        maps_link = f"https://www.google.com/maps/search/?api=1&query={lat},{lon}"
+                        
+                        places[name] = {
+                            'name': name, 
+                            'distance': distance,
+                            'address': address,
+                            'maps_link': maps_link
+                        }
+        
+        places_list = list(places.values())
+        return sorted(places_list, key=lambda x: x['distance'])[:5]
+    except requests.exceptions.Timeout:
+        logging.error(f"Timeout querying Overpass API for {amenity}. The request took longer than 10 seconds.")
+        return []
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error querying Overpass API for {amenity}: {e}")
+        return []
+
+
+def nearby_facilities(user_lat, user_lon):
+    return {
+        "multi_specialty": find_nearby_places(user_lat, user_lon, "hospital"),
+        "specialized": find_nearby_places(user_lat, user_lon, "clinic"),
+        "nursing_home": find_nearby_places(user_lat, user_lon, "nursing_home"),
+    }
@@ -1,14 +1,34 @@
 from PIL import Image
-from flask import Flask, render_template, request, redirect, url_for, flash
-from tensorflow.keras.utils import load_img
-from keras_preprocessing.image import img_to_array
-from keras.models import load_model
-import numpy as np
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, Response, abort, g, send_file, session
+import io
 import logging
-import os
 import math
-import requests
-import base64
+import os
+import hashlib
+import hmac
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+from admission import Overloaded, controller_from_env
+from advice import ADVICE_THRESHOLD, CARE_INSIGHTS, PREVENTION_INSIGHTS, nearby_facilities
+from cache import LRUCache
+from cascade import SCREEN, Cascade, band_from_env
+from cpu_plan import current_plan
+from history import history_from_env
+from image_store import sniff_mimetype, store_from_env
+from jobs import JobRunner, jobs_from_env
+from numpy_backend import load_model as load_numpy_model
+from metrics import ERRORS, PREDICTIONS, REQUESTS, cache_lookup, stage, stage_timings, render as render_metrics
+from preprocessing import load_tensor, to_tensor
+from raw_pixels import InvalidPixels, max_body_bytes, parse as parse_pixels, to_uint8 as pixels_to_uint8
+from profiler import StackSampler, flame_graph_svg, tracemalloc_report
+from registry import ModelRegistry
+from shadow import ShadowScorer
+from tiers import FAST, FULL, Tier, selector_from_env
+from tta import tta_from_env
 
 app = Flask(__name__)
 
@@ -16,157 +36,658 @@ app = Flask(__name__)
 logging.basicConfig(level=logging.INFO)
 
 # --- ML Model and Helpers ---
-Model_Path = 'models/pneu_cnn_model.h5'
-model = load_model(Model_Path)
+# SERVING_BACKEND=numpy serves every model through the TensorFlow-free NumPy
+# forward pass. Preloading under gunicorn requires it: TensorFlow's runtime
+# does not survive fork, but plain NumPy weights can be shared copy-on-write.
+# The NumPy backend also memory-maps flat exports (*.json, see export_weights.py).
+SERVING_BACKEND = os.environ.get('SERVING_BACKEND', 'keras')
+
+def load_keras_model(path):
+    # Imported here so that TensorFlow only loads in processes that use it.
+    from keras.models import load_model
+    return load_model(path)
+
+load_serving_model = load_numpy_model if SERVING_BACKEND == 'numpy' else load_keras_model
+# With GUNICORN_PRELOAD=1 this module is imported by the gunicorn master, so
+# background threads are started per worker in gunicorn.conf.py's post_fork.
+PRELOADED = os.environ.get('GUNICORN_PRELOAD') == '1'
+
+# The served model comes from the registry, which hot-swaps new versions as
+# the manifest in MODEL_REGISTRY_DIR changes and falls back to Model_Path.
+Model_Path = os.environ.get('MODEL_PATH', 'models/pneu_cnn_model.h5')
+registry = None
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 
+# --- Admission Control ---
+admission = controller_from_env()
+
+# --- Quality-of-Service Tiers ---
+# An optional fast, low-resolution variant registered next to the main model.
+# When it is present the serving path degrades to it under load.
+Fast_Model_Path = os.environ.get('FAST_MODEL_PATH', 'models/pneu_cnn_model_fast.h5')
+Fast_Model_Size = int(os.environ.get('FAST_MODEL_SIZE', 250))
+fast_tier = None
+tier_selector = selector_from_env()
+
+def select_tier(current):
+    if fast_tier is not None and tier_selector.select(admission.queue_depth) == FAST:
+        return fast_tier
+    return current.tier
+
+# --- Screening Cascade ---
+# With CASCADE_ENABLED=1 a tiny screening model scores every image first and
+# only scores inside the uncertainty band are escalated to the selected tier.
+Screen_Model_Path = os.environ.get('SCREEN_MODEL_PATH', 'models/pneu_cnn_model_screen.h5')
+Screen_Model_Size = int(os.environ.get('SCREEN_MODEL_SIZE', 128))
+cascade = None
+
+def score_image(img, tier, x=None):
+    # x is the image already preprocessed for tier, if the caller has it.
+    if cascade is not None:
+        return cascade.run(img, tier, x)
+    if x is None:
+        with stage('resize'):
+            x = to_tensor(img, tier.target_size)
+    with stage('inference'):
+        score = float(tier.model.predict(x)[0][0])
+    return score, tier
+
+# --- Test-Time Augmentation ---
+# With TTA_ENABLED=1, scores within TTA_MARGIN of either threshold are
+# re-scored as the average over flipped, shifted and cropped views.
+tta = tta_from_env()
+
+# --- Explanations ---
+# Full-resolution tensors of recent uploads, keyed by the SHA-256 of the image
+# bytes and the input size, so /explain can run Grad-CAM without another
+# upload or decode. Heatmaps are keyed by model version as well.
+tensor_cache = LRUCache(int(os.environ.get('EXPLAIN_TENSOR_CACHE_SIZE', 32)))
+heatmap_cache = LRUCache(int(os.environ.get('EXPLAIN_HEATMAP_CACHE_SIZE', 128)))
+HEATMAP_SIZE = int(os.environ.get('EXPLAIN_HEATMAP_SIZE', 224))
+# Grad-CAM needs gradients, so the NumPy backend loads a Keras copy of the
+# served version (the .h5 a flat export was made from) on first use, inside
+# the worker.
+gradcam_models = LRUCache(1)
+gradcam_lock = threading.Lock()
+
+def gradcam_model(current):
+    if SERVING_BACKEND != 'numpy':
+        return current.tier.model
+    with gradcam_lock:
+        model = gradcam_models.get(current.version)
+        if model is None:
+            model = load_keras_model(current.tier.model.source or current.path)
+            gradcam_models.put(current.version, model)
+        return model
+
+def stored_tensor(image_hash, target_size):
+    """Rebuild an evicted tensor from the image store, or None if the image is gone too."""
+    f = image_store.open(image_hash)
+    if f is None:
+        return None
+    with f, stage('resize'):
+        x = load_tensor(f, target_size)
+    tensor_cache.put((image_hash, target_size), x)
+    return x
+
+# --- Image Store ---
+# Every accepted upload is kept on disk under its SHA-256, so explanations and
+# later re-scoring can refer to the image by hash instead of asking for it again.
+image_store = store_from_env()
+
+# --- Prediction History ---
+# Every prediction is queued for the prediction table in instance/users.db and
+# written in batches by a background thread; PREDICTION_HISTORY=0 turns it off.
+history = history_from_env()
+
+# --- Job Queue ---
+# POST /jobs stores the uploads and queues one durable job per image in
+# instance/jobs.db. A runner thread in each worker claims queued jobs in
+# batches whenever no live request is waiting for or holding an inference
+# slot, and scores them JOBS_CHUNK_SIZE at a time, each chunk in an admission
+# slot like a live request. Jobs not reached before live traffic arrives go
+# back on the queue.
+jobs = jobs_from_env()
+MAX_JOB_WAIT_SECONDS = float(os.environ.get('JOBS_MAX_WAIT_SECONDS', 30))
+JOB_CHUNK_SIZE = int(os.environ.get('JOBS_CHUNK_SIZE', 1))
+
+def score_jobs(batch):
+    current = registry.current
+    results, errors = {}, {}
+    for i in range(0, len(batch), JOB_CHUNK_SIZE):
+        if i and admission.queue_depth:
+            break
+        xs, scored = [], []
+        for job_id, image_hash, created_at in batch[i:i + JOB_CHUNK_SIZE]:
+            x = cache_lookup('tensor', tensor_cache.get((image_hash, current.tier.target_size)))
+            if x is None:
+                try:
+                    x = stored_tensor(image_hash, current.tier.target_size)
+                except (OSError, ValueError) as e:
+                    # Only this job fails; the rest of the batch is still scored.
+                    errors[job_id] = f"The stored image could not be decoded: {e}"
+                    continue
+            if x is None:
+                errors[job_id] = 'The image is no longer in the image store.'
+                continue
+            xs.append(x)
+            scored.append((job_id, image_hash, created_at))
+        if not xs:
+            continue
+        started_at = time.time()
+        try:
+            with admission.admit():
+                start = time.perf_counter()
+                with stage('job_inference'):
+                    scores = current.tier.model.predict(np.concatenate(xs), batch_size=len(xs), verbose=0)[:, 0]
+                seconds_per_image = (time.perf_counter() - start) / len(xs)
+        except Overloaded:
+            break
+        for (job_id, image_hash, created_at), score in zip(scored, scores.tolist()):
+            label = 'positive' if score >= current.threshold else 'negative'
+            PREDICTIONS.labels(label, FULL).inc()
+            results[job_id] = {'score': score, 'label': label, 'threshold': current.threshold, 'model_version': current.version}
+            if history is not None:
+                history.record(image_hash, score, label, current.version, FULL, 1,
+                               {'job_wait': started_at - created_at, 'job_inference': seconds_per_image})
+    return results, errors
+
+job_runner = JobRunner(
+    jobs, score_jobs,
+    idle=lambda: admission.queue_depth == 0,
+    batch_size=int(os.environ.get('JOBS_BATCH_SIZE', 8)),
+    poll_interval=float(os.environ.get('JOBS_POLL_SECONDS', 0.5)),
+    retention_seconds=float(os.environ.get('JOBS_RETENTION_HOURS', 24)) * 3600,
+)
+
+# --- Shadow Scoring ---
+# A candidate model set via SHADOW_MODEL_PATH scores a sample of the tensors
+# already built for the live model on a background thread, for comparison only.
+Shadow_Model_Path = os.environ.get('SHADOW_MODEL_PATH')
+shadow = None
+
+# --- Model Loading ---
+# Models load on a background thread, so the index page, /queue and /metrics
+# answer within a fraction of a second of boot. Until models_ready is set,
+# routes that need a model answer 503. A preloaded master loads the models
+# synchronously before it forks.
+models_ready = threading.Event()
+model_load_error = None
+
+def load_models():
+    global registry, fast_tier, cascade, shadow
+    registry = ModelRegistry(
+        os.environ.get('MODEL_REGISTRY_DIR', 'models/registry'),
+        Model_Path,
+        load_serving_model,
+        poll_interval=float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 5.0)),
+        on_swap=run_self_test,
+    )
+    if os.path.exists(Fast_Model_Path):
+        fast_tier = Tier(FAST, load_serving_model(Fast_Model_Path), (Fast_Model_Size, Fast_Model_Size))
+        logging.info(f"Registered fast tier from {Fast_Model_Path} at {Fast_Model_Size}x{Fast_Model_Size}.")
+    if os.environ.get('CASCADE_ENABLED') == '1':
+        if os.path.exists(Screen_Model_Path):
+            screen_tier = Tier(SCREEN, load_serving_model(Screen_Model_Path), (Screen_Model_Size, Screen_Model_Size))
+            cascade = Cascade(screen_tier, *band_from_env())
+            logging.info(f"Cascade enabled with band [{cascade.low}, {cascade.high}].")
+        else:
+            logging.warning(f"CASCADE_ENABLED is set but {Screen_Model_Path} does not exist; cascade disabled.")
+    if Shadow_Model_Path:
+        shadow_model = load_serving_model(Shadow_Model_Path)
+        shadow = ShadowScorer(
+            Tier('shadow', shadow_model, tuple(shadow_model.input_shape[1:3])),
+            os.environ.get('SHADOW_LOG_PATH', 'instance/shadow.jsonl'),
+            sample_rate=float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1)),
+            max_queue=int(os.environ.get('SHADOW_MAX_QUEUE', 16)),
+        )
+        logging.info(f"Shadow scoring {Shadow_Model_Path} on {shadow.sample_rate:.0%} of traffic.")
+    models_ready.set()
+
+# Threads don't survive fork, so a preloaded master leaves these to each worker.
+def start_background_threads():
+    registry.start()
+    if shadow is not None:
+        shadow.start()
+    if history is not None:
+        history.start()
+    job_runner.start()
+
+# --- Health Checks ---
+# /healthz only says the process is up. /readyz turns 200 once the models are
+# loaded and a synthetic image has been scored end to end within
+# READYZ_MAX_SELF_TEST_SECONDS, so no traffic reaches a worker that is still
+# cold. The test runs again for every version the registry swaps in, and
+# readiness drops until it has passed for the version being served.
+STARTED_AT = time.time()
+SELF_TEST_MAX_SECONDS = float(os.environ.get('READYZ_MAX_SELF_TEST_SECONDS', 2.0))
+SELF_TEST_ATTEMPTS = int(os.environ.get('READYZ_SELF_TEST_ATTEMPTS', 5))
+self_test = None
+
+def run_self_test(current=None):
+    global self_test
+    current = current or registry.current
+    img = Image.linear_gradient('L')
+    for attempt in range(1, SELF_TEST_ATTEMPTS + 1):
+        start = time.perf_counter()
+        score = float(current.tier.model.predict(to_tensor(img, current.tier.target_size))[0][0])
+        seconds = time.perf_counter() - start
+        passed = 0.0 <= score <= 1.0 and seconds <= SELF_TEST_MAX_SECONDS
+        self_test = {
+            'version': current.version,
+            'passed': passed,
+            'score': score if math.isfinite(score) else None,
+            'seconds': round(seconds, 4),
+            'max_seconds': SELF_TEST_MAX_SECONDS,
+            'attempts': attempt,
+        }
+        if passed:
+            logging.info(f"Self-test passed for version {current.version} in {seconds:.3f}s.")
+            return
+    logging.error(f"Self-test failed for version {current.version}: {self_test}")
+
+def load_models_in_background():
+    global model_load_error
+    try:
+        load_models()
+        run_self_test()
+    except Exception as e:
+        model_load_error = str(e)
+        logging.exception("Failed to load models; this worker will not serve predictions.")
+        return
+    start_background_threads()
+
+if PRELOADED:
+    load_models()
+    run_self_test()
+else:
+    threading.Thread(target=load_models_in_background, name='model-loader', daemon=True).start()
+
+def not_ready(endpoint):
+    """Headers for a 503 answered while the models are still loading."""
+    ERRORS.labels(endpoint, 'not_ready').inc()
+    return {'Retry-After': '5'}
+
+# --- Admin Profiling ---
+# Disabled unless PROFILER_TOKEN is set; admin requests must present the token
+# in the X-Admin-Token header.
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')
+MAX_PROFILE_SECONDS = 60.0
+profile_lock = threading.Lock()
+last_tracemalloc_report = None
+
+def is_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    return bool(PROFILER_TOKEN) and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+if PROFILER_TOKEN:
+    @app.before_request
+    def start_tracemalloc():
+        # tracemalloc is process-wide, so only one request is traced at a time.
+        if request.headers.get('X-Tracemalloc') == '1' and is_admin() and not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.environ.get('TRACEMALLOC_FRAMES', 1)))
+            g.tracemalloc = True
+
+    @app.after_request
+    def stop_tracemalloc(response):
+        global last_tracemalloc_report
+        if g.get('tracemalloc'):
+            g.tracemalloc = False
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            last_tracemalloc_report = f"{request.method} {request.path}: peak {peak / 1024:.1f} KiB\n{tracemalloc_report(snapshot)}"
+            logging.info(f"tracemalloc snapshot for {last_tracemalloc_report}")
+            response.headers['X-Tracemalloc-Peak-KiB'] = f"{peak / 1024:.1f}"
+        return response
+
+    @app.teardown_request
+    def abandon_tracemalloc(exc):
+        # Runs even when the request raised before after_request could stop tracing.
+        if g.get('tracemalloc'):
+            g.tracemalloc = False
+            tracemalloc.stop()
+
+# --- Raw Pixel Ingest ---
+# /predict/raw takes pixels that are already decoded (a .npy array or the
+# compact PXRW format in raw_pixels.py), so integrations skip the JPEG encode
+# and decode. Each side must be within RAW_MIN_SIDE..RAW_MAX_SIDE pixels. The
+# image store keeps a PNG of the 8-bit pixels under the hash of the body.
+RAW_MIN_SIDE = int(os.environ.get('RAW_MIN_SIDE', 64))
+RAW_MAX_SIDE = int(os.environ.get('RAW_MAX_SIDE', 4096))
+RAW_MAX_BYTES = max_body_bytes(RAW_MAX_SIDE)
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# --- Geolocation Helpers ---
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371  # Radius of Earth in kilometers
-    dLat = math.radians(lat2 - lat1)
-    dLon = math.radians(lon2 - lon1)
-    a = (math.sin(dLat / 2) * math.sin(dLat / 2) +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dLon / 2) * math.sin(dLon / 2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    return distance
-
-def find_nearby_places(user_lat, user_lon, amenity):
-    overpass_url = "https://overpass-api.de/api/interpreter"
-    overpass_query = f"""
-    [out:json];
-    (
-      node(around:20000,{user_lat},{user_lon})["amenity"="{amenity}"];
-      way(around:20000,{user_lat},{user_lon})["amenity"="{amenity}"];
-      relation(around:20000,{user_lat},{user_lon})["amenity"="{amenity}"];
-    );
-    out center;
-    """
-    try:
-        response = requests.post(overpass_url, data={'data': overpass_query}, timeout=10) # Added timeout
-        response.raise_for_status()
-        data = response.json()
-        
-        places = {} # Use a dict to handle duplicates
-        for element in data['elements']:
-            if 'tags' in element and 'name' in element['tags']:
-                name = element['tags']['name']
-                if name not in places:
-                    lat = element.get('lat') or element.get('center', {}).get('lat')
-                    lon = element.get('lon') or element.get('center', {}).get('lon')
-                    if lat and lon:
-                        distance = haversine(user_lat, user_lon, lat, lon)
-                        address_tags = element.get('tags', {})
-                        address_parts = [
-                            address_tags.get('addr:housenumber'),
-                            address_tags.get('addr:street'),
-                            address_tags.get('addr:city')
-                        ]
-                        address = ", ".join(filter(None, address_parts))
-                        if not address:
-                            address = f"{lat:.4f}, {lon:.4f}"
-                        
-                        maps_link = f"https://www.google.com/maps/search/?api=1&query={lat},{lon}"
-                        
-                        places[name] = {
-                            'name': name, 
-                            'distance': distance,
-                            'address': address,
-                            'maps_link': maps_link
-                        }
-        
-        places_list = list(places.values())
-        return sorted(places_list, key=lambda x: x['distance'])[:5]
-    except requests.exceptions.Timeout:
-        logging.error(f"Timeout querying Overpass API for {amenity}. The request took longer than 10 seconds.")
-        return []
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error querying Overpass API for {amenity}: {e}")
-        return []
-
 # --- Routes ---
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    return jsonify(status='ok', pid=os.getpid(), uptime_seconds=round(time.time() - STARTED_AT, 1))
+
+@app.route('/readyz')
+def readyz():
+    ready = (models_ready.is_set() and self_test is not None and self_test['passed']
+             and self_test['version'] == registry.current.version)
+    status = {
+        'ready': ready,
+        'uptime_seconds': round(time.time() - STARTED_AT, 1),
+        'self_test': self_test,
+        'p95_latency_seconds': tier_selector.snapshot()['p95_latency_seconds'],
+    }
+    if models_ready.is_set():
+        current = registry.current
+        status['version'] = current.version
+        status['warmup_seconds'] = round(current.warmup_seconds, 4)
+    if model_load_error:
+        status['error'] = model_load_error
+    return jsonify(status), 200 if ready else 503
+
+@app.route('/queue')
+def queue_status():
+    status = admission.snapshot()
+    status['qos'] = tier_selector.snapshot()
+    status['tiers'] = [FULL] + ([FAST] if fast_tier is not None else [])
+    if cascade is not None:
+        status['cascade'] = cascade.snapshot()
+    status['cpu'] = current_plan()
+    status['image_store'] = image_store.snapshot()
+    if history is not None:
+        status['history'] = history.snapshot()
+    status['jobs'] = jobs.snapshot()
+    status['jobs']['runner'] = job_runner.snapshot()
+    return jsonify(status)
+
+@app.route('/model')
+def model_status():
+    if not models_ready.is_set():
+        return jsonify(error='Models are still loading.'), 503, not_ready('model')
+    status = registry.snapshot()
+    if shadow is not None:
+        status['shadow'] = shadow.snapshot()
+    return jsonify(status)
+
+@app.route('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+@app.route('/admin/profile')
+def admin_profile():
+    if not is_admin():
+        abort(404)
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), MAX_PROFILE_SECONDS)
+        interval = max(float(request.args.get('interval', 0.005)), 0.001)
+    except ValueError:
+        return jsonify(error='seconds and interval must be numbers.'), 400
+    if not profile_lock.acquire(blocking=False):
+        return jsonify(error='A profile is already running in this worker.'), 409
+    try:
+        logging.info(f"Sampling stacks for {seconds:.1f}s every {interval * 1000:.1f}ms.")
+        sampler = StackSampler(interval).run(seconds)
+    finally:
+        profile_lock.release()
+    if request.args.get('format') == 'svg':
+        return Response(flame_graph_svg(sampler.stacks, title=f"pid {os.getpid()}, {seconds:.1f}s"), mimetype='image/svg+xml')
+    return Response(sampler.collapsed(), mimetype='text/plain')
+
+@app.route('/admin/tracemalloc')
+def admin_tracemalloc():
+    if not is_admin():
+        abort(404)
+    return Response(last_tracemalloc_report or 'No request has been traced yet.\n', mimetype='text/plain')
+
+@app.route('/explain/<image_hash>')
+def explain(image_hash):
+    REQUESTS.labels('explain').inc()
+    if not models_ready.is_set():
+        return jsonify(error='Models are still loading.'), 503, not_ready('explain')
+    current = registry.current
+    heatmap = cache_lookup('heatmap', heatmap_cache.get((current.version, image_hash)))
+    if heatmap is None:
+        x = cache_lookup('tensor', tensor_cache.get((image_hash, current.tier.target_size)))
+        if x is None:
+            x = stored_tensor(image_hash, current.tier.target_size)
+        if x is None:
+            ERRORS.labels('explain', 'unknown_image').inc()
+            return jsonify(error='Unknown image; please run the prediction again.'), 404
+        from gradcam import grad_cam, overlay_png  # imports TensorFlow
+        try:
+            with admission.admit(), stage('gradcam'):
+                heatmap = overlay_png(x, grad_cam(gradcam_model(current), x), size=HEATMAP_SIZE)
+        except Overloaded as e:
+            ERRORS.labels('explain', 'overloaded').inc()
+            return jsonify(error='The server is busy right now. Please try again shortly.'), 503, {'Retry-After': str(e.retry_after)}
+        heatmap_cache.put((current.version, image_hash), heatmap)
+    response = Response(heatmap, mimetype='image/png')
+    response.headers['X-Model-Version'] = current.version
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
+
+@app.route('/images/<image_hash>')
+def stored_image(image_hash):
+    f = image_store.open(image_hash)
+    if f is None:
+        abort(404)
+    mimetype = sniff_mimetype(f.read(8))
+    f.seek(0)
+    # The URL names the content, so the response never changes.
+    response = send_file(f, mimetype=mimetype, etag=image_hash, max_age=31536000)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def create_jobs():
+    REQUESTS.labels('jobs').inc()
+    imagefiles = request.files.getlist('imagefile')
+    if not imagefiles or any(not allowed_file(imagefile.filename) for imagefile in imagefiles):
+        ERRORS.labels('jobs', 'invalid').inc()
+        return jsonify(error='Upload one or more PNG or JPEG images as imagefile.'), 400
+    if jobs.queued() + len(imagefiles) > jobs.max_queued:
+        ERRORS.labels('jobs', 'overloaded').inc()
+        return jsonify(error='The job queue is full. Please try again later.'), 503, {'Retry-After': '30'}
+    uploads = []
+    for imagefile in imagefiles:
+        with stage('upload_read'):
+            image_bytes = imagefile.read()
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                mode = img.mode
+                img.load()  # a truncated or corrupt file fails here, not in the runner
+        except OSError:
+            ERRORS.labels('jobs', 'invalid').inc()
+            return jsonify(error=f"{imagefile.filename} is not a valid image."), 400
+        if mode != 'L':
+            ERRORS.labels('jobs', 'not_grayscale').inc()
+            return jsonify(error=f"{imagefile.filename} does not appear to be a grayscale X-ray image."), 400
+        uploads.append(image_bytes)
+    with stage('store'):
+        image_hashes = [image_store.put(image_bytes) for image_bytes in uploads]
+    job_ids = jobs.enqueue(image_hashes)
+    return jsonify(jobs=[
+        {'id': job_id, 'image_hash': image_hash, 'status': 'queued', 'url': url_for('job_status', job_id=job_id)}
+        for job_id, image_hash in zip(job_ids, image_hashes)
+    ]), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_JOB_WAIT_SECONDS)
+    except ValueError:
+        return jsonify(error='wait must be a number of seconds.'), 400
+    job = jobs.wait(job_id, wait) if wait else jobs.get(job_id)
+    if job is None:
+        return jsonify(error='Unknown job.'), 404
+    return jsonify(job)
+
+def score_upload(img, image_hash):
+    """Score a decoded grayscale image through admission, tiers, cascade and TTA.
+
+    Returns ``(model version, score, tier that served it, TTA views)``.
+    """
+    current = registry.current
+    tier = select_tier(current)
+    with admission.admit():
+        start = time.perf_counter()
+        # The full model's tensor is cached for /explain whichever tier serves.
+        tensor_key = (image_hash, current.tier.target_size)
+        x = cache_lookup('tensor', tensor_cache.get(tensor_key))
+        if x is None:
+            with stage('resize'):
+                x = to_tensor(img, current.tier.target_size)
+            tensor_cache.put(tensor_key, x)
+        prediction, served_tier = score_image(img, tier, x if tier is current.tier else None)
+        inference_seconds = time.perf_counter() - start
+        tta_views = 1
+        if tta is not None and tta.is_borderline(prediction, (current.threshold, ADVICE_THRESHOLD)):
+            tta_x = x if served_tier is current.tier else to_tensor(img, served_tier.target_size)
+            with stage('tta'):
+                prediction, tta_views = tta.refine(served_tier.model, tta_x, prediction)
+        tier_selector.observe(time.perf_counter() - start)
+    # Only compare against the full model's own score, and only while no
+    # live requests are waiting for an inference slot.
+    if shadow is not None and served_tier is current.tier and tta_views == 1 and admission.queued == 0:
+        shadow.submit(x, prediction, inference_seconds, image_hash, current.version, current.threshold)
+    return current, prediction, served_tier, tta_views
+
+@app.route('/predict/raw', methods=['POST'])
+def predict_raw():
+    with stage_timings() as timings:
+        return predict_pixels(timings)
+
+def predict_pixels(timings):
+    REQUESTS.labels('predict_raw').inc()
+    if (request.content_length or 0) > RAW_MAX_BYTES:
+        ERRORS.labels('predict_raw', 'invalid').inc()
+        return jsonify(error=f"The body is larger than {RAW_MAX_BYTES} bytes."), 413
+    if not models_ready.is_set():
+        return jsonify(error='Models are still loading.'), 503, not_ready('predict_raw')
+    # A chunked body has no Content-Length, so at most one byte more than
+    # the limit is read, which tells an oversized body from one that fits.
+    request.max_content_length = RAW_MAX_BYTES + 1
+    try:
+        bits_stored = int(request.headers.get('X-Bits-Stored', 0)) or None
+        with stage('upload_read'):
+            body = request.get_data(cache=False)
+            if len(body) > RAW_MAX_BYTES:
+                ERRORS.labels('predict_raw', 'invalid').inc()
+                return jsonify(error=f"The body is larger than {RAW_MAX_BYTES} bytes."), 413
+            image_hash = hashlib.sha256(body).hexdigest()
+        with stage('decode'):
+            pixels, bits_stored = parse_pixels(body, bits_stored, RAW_MIN_SIDE, RAW_MAX_SIDE)
+            img = Image.fromarray(pixels_to_uint8(pixels, bits_stored), 'L')
+    except (InvalidPixels, ValueError) as e:
+        ERRORS.labels('predict_raw', 'invalid').inc()
+        return jsonify(error=str(e)), 400
+    with stage('store'):
+        # Kept as a PNG of the 8-bit pixels the model scores, under the hash
+        # of the raw body, so /explain and rescore.py can load it like an upload.
+        if not image_store.touch(image_hash):
+            buffer = io.BytesIO()
+            img.save(buffer, format='PNG', compress_level=1)
+            image_store.put(buffer.getvalue(), image_hash)
+    try:
+        current, prediction, served_tier, tta_views = score_upload(img, image_hash)
+    except Overloaded as e:
+        ERRORS.labels('predict_raw', 'overloaded').inc()
+        return jsonify(error='The server is busy right now. Please try again shortly.'), 503, {'Retry-After': str(e.retry_after)}
+    label = 'positive' if prediction >= current.threshold else 'negative'
+    PREDICTIONS.labels(label, served_tier.name).inc()
+    if history is not None:
+        history.record(image_hash, prediction, label, current.version, served_tier.name, tta_views, timings, session.get('_user_id'))
+    response = jsonify(score=prediction, label=label, threshold=current.threshold, tier=served_tier.name,
+                       model_version=current.version, tta_views=tta_views, image_hash=image_hash,
+                       shape=list(pixels.shape), bits_stored=bits_stored)
+    response.headers['X-Model-Tier'] = served_tier.name
+    response.headers['X-Model-Version'] = current.version
+    response.headers['X-Image-Hash'] = image_hash
+    return response
+
 @app.route('/predict', methods=['POST'])
 def predict():
+    with stage_timings() as timings:
+        return predict_upload(timings)
+
+def predict_upload(timings):
     logging.info("Prediction request received.")
+    REQUESTS.labels('predict').inc()
     if 'imagefile' not in request.files:
+        ERRORS.labels('predict', 'invalid').inc()
         return render_template('index.html', error='No image uploaded.')
 
     imagefile = request.files['imagefile']
 
     if imagefile.filename == '':
+        ERRORS.labels('predict', 'invalid').inc()
         return render_template('index.html', error='No selected file.')
 
     if not allowed_file(imagefile.filename):
+        ERRORS.labels('predict', 'invalid').inc()
         return render_template('index.html', error='Please upload a valid image file.')
 
-    temp_image_path = os.path.join('/tmp', imagefile.filename)
+    if not models_ready.is_set():
+        return render_template('index.html', error='The model is still loading. Please try again shortly.'), 503, not_ready('predict')
+
     try:
-        # Save the image temporarily to check its mode
-        imagefile.seek(0)
-        imagefile.save(temp_image_path)
-        
-        img_check = Image.open(temp_image_path)
+        with stage('upload_read'):
+            image_bytes = imagefile.read()
+            image_hash = hashlib.sha256(image_bytes).hexdigest()
+
+        img_check = Image.open(io.BytesIO(image_bytes))
         if img_check.mode != 'L':
+            ERRORS.labels('predict', 'not_grayscale').inc()
             return render_template('index.html', error='Warning: This does not appear to be a grayscale X-ray image. Please upload a valid X-ray.')
-        
-        img = load_img(temp_image_path, target_size=(500, 500), color_mode='grayscale')
-        x = img_to_array(img)
-        x /= 255.0
-        x = np.expand_dims(x, axis=0)
+        with stage('decode'):
+            img_check.load()
+        # Only images that decode are kept, so the store never holds an
+        # upload that /explain or rescore.py would fail on.
+        with stage('store'):
+            image_store.put(image_bytes, image_hash)
 
-        prediction = model.predict(x)[0][0]
+        current, prediction, served_tier, tta_views = score_upload(img_check, image_hash)
+        served_by = served_tier.name
         prediction_percent = prediction * 100
-        classification = f"Positive ({prediction_percent:.2f}%)" if prediction >= 0.5 else f"Negative ({prediction_percent:.2f}%)"
-
-        # Encode the image to base64 to display it on the webpage
-        with open(temp_image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-        image_data_url = f"data:image/jpeg;base64,{encoded_string}"
-
+        classification = f"Positive ({prediction_percent:.2f}%)" if prediction >= current.threshold else f"Negative ({prediction_percent:.2f}%)"
+        label = 'positive' if prediction >= current.threshold else 'negative'
+        PREDICTIONS.labels(label, served_by).inc()
 
         insights = []
         hospitals = {}
-        if prediction_percent >= 20:
-            insights = [
-                "**Get Plenty of Rest:** Your body needs energy to fight infection.",
-                "**Stay Hydrated:** Fluids help loosen mucus and prevent dehydration.",
-                "**Follow Medical Advice:** Take all medications as prescribed by your doctor.",
-                "**Manage Symptoms:** Consult a doctor about over-the-counter symptom relief.",
-            ]
+        if prediction >= ADVICE_THRESHOLD:
+            insights = CARE_INSIGHTS
             user_lat = request.form.get('latitude')
             user_lon = request.form.get('longitude')
             if user_lat and user_lon:
-                user_lat, user_lon = float(user_lat), float(user_lon)
-                hospitals = {
-                    "multi_specialty": find_nearby_places(user_lat, user_lon, "hospital"),
-                    "specialized": find_nearby_places(user_lat, user_lon, "clinic"),
-                    "nursing_home": find_nearby_places(user_lat, user_lon, "nursing_home"),
-                }
+                hospitals = nearby_facilities(float(user_lat), float(user_lon))
         else:
-            insights = [
-                "**Practice Good Hygiene:** Wash hands frequently.",
-                "**Avoid Smoking:** Smoking damages your lungs.",
-                "**Get Vaccinated:** Ask your doctor about pneumonia and flu vaccines.",
-                "**Maintain a Healthy Lifestyle:** A balanced diet and exercise boost your immune system.",
-            ]
+            insights = PREVENTION_INSIGHTS
 
-        return render_template('index.html', prediction=classification, imagePath=image_data_url, insights=insights, hospitals=hospitals)
+        with stage('render'):
+            response = make_response(render_template('index.html', prediction=classification, imagePath=url_for('stored_image', image_hash=image_hash), insights=insights, hospitals=hospitals, tier=served_by, model_version=current.version, image_hash=image_hash))
+        response.headers['X-Model-Tier'] = served_by
+        response.headers['X-Model-Version'] = current.version
+        response.headers['X-TTA-Views'] = str(tta_views)
+        response.headers['X-Image-Hash'] = image_hash
+        if history is not None:
+            # Flask-Login keeps the signed-in user's id in the session.
+            history.record(image_hash, prediction, label, current.version, served_by, tta_views, timings, session.get('_user_id'))
+        return response
 
+    except Overloaded as e:
+        logging.warning(f"Shedding prediction request: {e.reason}")
+        ERRORS.labels('predict', 'overloaded').inc()
+        return render_template('index.html', error='The server is busy right now. Please try again shortly.'), 503, {'Retry-After': str(e.retry_after)}
     except Exception as e:
         logging.error(f"Error processing image: {e}")
+        ERRORS.labels('predict', 'exception').inc()
         return render_template('index.html', error='Invalid image file or error processing image.')
-    finally:
-        # Clean up the temporary file
-        if os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
 
 
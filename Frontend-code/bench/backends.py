@@ -0,0 +1,84 @@
+"""Inference backends and preprocessing variants shared by the benchmarks.
+
+Every backend is a callable taking a float32 NHWC batch and returning an
+(N, 1) array of probabilities; every preprocessing variant takes encoded
+image bytes and a (height, width) target size and returns a (1, H, W, 1)
+batch. New optimized paths should be registered here so that both the
+microbenchmarks and the parity harness pick them up.
+"""
+import io
+import sys
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import to_tensor
+
+
+def tflite_runner(model, threads=None):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    interpreter = tf.lite.Interpreter(model_content=converter.convert(), num_threads=threads)
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    state = {'batch': None}
+
+    def run(x):
+        if state['batch'] != len(x):
+            interpreter.resize_tensor_input(input_index, list(x.shape))
+            interpreter.allocate_tensors()
+            state['batch'] = len(x)
+        interpreter.set_tensor(input_index, x)
+        interpreter.invoke()
+        return interpreter.get_tensor(output_index)
+
+    return run
+
+
+def inference_backends(model, threads=None, skip=()):
+    """Build every available backend for ``model``, keyed by name."""
+    import tensorflow as tf
+    from numpy_backend import NumpyModel
+
+    compiled = tf.function(lambda x: model(x, training=False))
+    backends = {
+        'keras predict': lambda x: model.predict(x, batch_size=len(x), verbose=0),
+        'direct call': lambda x: model(x, training=False).numpy(),
+        'tf.function': lambda x: compiled(x).numpy(),
+        'numpy forward': NumpyModel.from_keras(model).predict,
+    }
+    if 'tflite' not in skip:
+        try:
+            backends['tflite'] = tflite_runner(model, threads)
+        except Exception as e:
+            print(f"TFLite conversion failed, skipping: {e}", file=sys.stderr)
+    return {name: run for name, run in backends.items() if name not in skip}
+
+
+def preprocess_serving(data, target_size):
+    with Image.open(io.BytesIO(data)) as img:
+        return to_tensor(img, target_size)
+
+
+def preprocess_keras(data, target_size):
+    from tensorflow.keras.utils import img_to_array, load_img
+    x = img_to_array(load_img(io.BytesIO(data), target_size=target_size, color_mode='grayscale'))
+    x /= 255.0
+    return x[np.newaxis]
+
+
+def preprocess_draft(data, target_size):
+    with Image.open(io.BytesIO(data)) as img:
+        # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale.
+        img.draft('L', (target_size[1], target_size[0]))
+        return to_tensor(img, target_size)
+
+
+PREPROCESSING = {
+    'serving': preprocess_serving,
+    'keras': preprocess_keras,
+    'draft': preprocess_draft,
+}
+# Variants that change the pixels by design. bench/parity.py reports them but
+# only fails on them when they are asked for by name.
+APPROXIMATE_PREPROCESSING = ('draft',)
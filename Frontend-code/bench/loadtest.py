@@ -0,0 +1,355 @@
+"""End-to-end load test for /predict.
+
+Starts the app either with the gunicorn command line from run.sh or with an
+in-process threaded server, points facility lookups at a local Overpass stub,
+and replays the sample X-rays in static/ at a fixed concurrency (closed loop)
+or a Poisson arrival rate (open loop). Reports throughput, latency
+percentiles, a per-stage breakdown from /metrics and RSS per worker, writes
+the results as JSON, and compares them with a stored baseline.
+
+Run from Frontend-code/:
+
+    python -m bench.loadtest --server gunicorn --concurrency 8 --duration 60
+    python -m bench.loadtest --server inprocess --rate 5 --output bench.json --baseline bench/baseline.json
+"""
+import argparse
+import http.server
+import json
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(FRONTEND_DIR, 'static')
+STAGE_LINE = re.compile(r'^pneumonia_stage_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$')
+# Lower is better for these; throughput is compared the other way round.
+COMPARED_LATENCIES = ('p50_ms', 'p95_ms', 'p99_ms')
+
+OVERPASS_RESPONSE = json.dumps({'elements': [
+    {'type': 'node', 'lat': 12.97 + i * 0.01, 'lon': 77.59 + i * 0.01,
+     'tags': {'name': f"Stub Hospital {i}", 'addr:street': 'Stub Road', 'addr:city': 'Stubville'}}
+    for i in range(8)
+]}).encode()
+
+
+class OverpassStub(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(OVERPASS_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(OVERPASS_RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_overpass_stub():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), OverpassStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/interpreter"
+
+
+def wait_until_up(base_url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + '/readyz', timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+class GunicornServer:
+    """run.sh as deployed, on a free port and with a private metrics directory."""
+
+    def __init__(self, env):
+        self.port = free_port()
+        self.metrics_dir = tempfile.mkdtemp(prefix='bench-metrics-')
+        env = dict(env, PORT=str(self.port), PROMETHEUS_MULTIPROC_DIR=self.metrics_dir)
+        self.process = subprocess.Popen(['sh', 'run.sh'], cwd=FRONTEND_DIR, env=env, start_new_session=True)
+        self.base_url = f"http://127.0.0.1:{self.port}"
+
+    def worker_pids(self):
+        pids = []
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if ppid == self.process.pid:
+                pids.append(int(entry))
+        return sorted(pids)
+
+    def stop(self):
+        os.killpg(self.process.pid, signal.SIGTERM)
+        self.process.wait(timeout=30)
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+
+
+class InProcessServer:
+    def __init__(self, env):
+        from werkzeug.serving import make_server
+        os.environ.update(env)
+        os.chdir(FRONTEND_DIR)
+        sys.path.insert(0, FRONTEND_DIR)
+        import app
+        self.server = make_server('127.0.0.1', 0, app.app, threaded=True)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def worker_pids(self):
+        return [os.getpid()]
+
+    def stop(self):
+        self.server.shutdown()
+
+
+def rss_kib(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def scrape_stages(base_url):
+    stages = {}
+    for line in requests.get(base_url + '/metrics', timeout=10).text.splitlines():
+        match = STAGE_LINE.match(line)
+        if match:
+            kind, name, value = match.groups()
+            stages.setdefault(name, {'sum': 0.0, 'count': 0.0})[kind] = float(value)
+    return stages
+
+
+def stage_breakdown(before, after):
+    breakdown = {}
+    for name, totals in after.items():
+        start = before.get(name, {'sum': 0.0, 'count': 0.0})
+        count = totals['count'] - start['count']
+        if count > 0:
+            breakdown[name] = {'count': int(count), 'mean_ms': round((totals['sum'] - start['sum']) / count * 1000, 2)}
+    return breakdown
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def load_images():
+    from PIL import Image
+    images = []
+    for name in sorted(os.listdir(STATIC_DIR)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        path = os.path.join(STATIC_DIR, name)
+        # /predict turns colour images away before they reach the model.
+        with Image.open(path) as img:
+            if img.mode != 'L':
+                continue
+        with open(path, 'rb') as f:
+            images.append((name, f.read()))
+    return images
+
+
+class LoadGenerator:
+    def __init__(self, base_url, images, latitude, longitude):
+        self.url = base_url + '/predict'
+        self.images = images
+        self.form = {'latitude': str(latitude), 'longitude': str(longitude)}
+        self.lock = threading.Lock()
+        self.results = []
+
+    def one(self, session):
+        name, data = random.choice(self.images)
+        start = time.perf_counter()
+        try:
+            response = session.post(self.url, files={'imagefile': (name, data)}, data=self.form, timeout=120)
+            status = response.status_code
+            # /predict renders its errors with a 200; only a scored image carries the tier header.
+            if status == 200 and 'X-Model-Tier' not in response.headers:
+                status = 'rejected'
+        except requests.RequestException:
+            status = 0
+        with self.lock:
+            self.results.append((time.perf_counter() - start, status))
+
+    def closed_loop(self, concurrency, duration):
+        deadline = time.monotonic() + duration
+
+        def worker():
+            with requests.Session() as session:
+                while time.monotonic() < deadline:
+                    self.one(session)
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def open_loop(self, rate, duration, max_in_flight=256):
+        deadline = time.monotonic() + duration
+        slots = threading.BoundedSemaphore(max_in_flight)
+        threads = []
+
+        def fire():
+            try:
+                with requests.Session() as session:
+                    self.one(session)
+            finally:
+                slots.release()
+
+        while time.monotonic() < deadline:
+            time.sleep(random.expovariate(rate))
+            if not slots.acquire(blocking=False):
+                with self.lock:
+                    self.results.append((None, -1))  # generator saturated
+                continue
+            thread = threading.Thread(target=fire)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+
+def summarize(results, elapsed):
+    latencies = sorted(latency for latency, status in results if status == 200)
+    statuses = {}
+    for _, status in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(results),
+        'ok': len(latencies),
+        'errors': len(results) - len(latencies),
+        'statuses': statuses,
+        'throughput_rps': round(len(latencies) / elapsed, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 1) if latencies else None,
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of regressions of ``result`` against ``baseline``."""
+    regressions = []
+    for key in COMPARED_LATENCIES:
+        new, old = result['summary'].get(key), baseline['summary'].get(key)
+        if new is not None and old and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old} -> {new} (+{new / old - 1:.0%})")
+    new, old = result['summary']['throughput_rps'], baseline['summary']['throughput_rps']
+    if old and new < old * (1 - tolerance):
+        regressions.append(f"throughput_rps: {old} -> {new} ({new / old - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=('gunicorn', 'inprocess'), default='gunicorn')
+    parser.add_argument('--url', help='Benchmark an already running server instead of starting one.')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--concurrency', type=int, default=4, help='Closed loop: concurrent clients.')
+    load.add_argument('--rate', type=float, help='Open loop: mean arrivals per second.')
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds of load discarded before measuring.')
+    parser.add_argument('--latitude', type=float, default=12.97)
+    parser.add_argument('--longitude', type=float, default=77.59)
+    parser.add_argument('--startup-timeout', type=float, default=180.0)
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare with this results file and exit 1 on regression.')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='Allowed relative regression.')
+    args = parser.parse_args()
+
+    stub, overpass_url = start_overpass_stub()
+    env = dict(os.environ, OVERPASS_URL=overpass_url)
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        server = GunicornServer(env) if args.server == 'gunicorn' else InProcessServer(env)
+        base_url = server.base_url
+    try:
+        wait_until_up(base_url, args.startup_timeout)
+        images = load_images()
+        mode = {'rate': args.rate} if args.rate else {'concurrency': args.concurrency}
+
+        def run(duration):
+            generator = LoadGenerator(base_url, images, args.latitude, args.longitude)
+            if args.rate:
+                generator.open_loop(args.rate, duration)
+            else:
+                generator.closed_loop(args.concurrency, duration)
+            return generator.results
+
+        if args.warmup > 0:
+            run(args.warmup)
+        before = scrape_stages(base_url)
+        start = time.monotonic()
+        results = run(args.duration)
+        elapsed = time.monotonic() - start
+        after = scrape_stages(base_url)
+
+        pids = server.worker_pids() if server else []
+        result = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'server': 'external' if args.url else args.server,
+            'load': dict(mode, duration_s=args.duration),
+            'summary': summarize(results, elapsed),
+            'stages': stage_breakdown(before, after),
+            'rss_kib': {str(pid): rss_kib(pid) for pid in pids},
+        }
+    finally:
+        if server:
+            server.stop()
+        stub.shutdown()
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('load') != result['load'] or baseline.get('server') != result['server']:
+            print(f"Warning: baseline was recorded with {baseline.get('server')} {baseline.get('load')}, "
+                  f"this run used {result['server']} {result['load']}.", file=sys.stderr)
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print('Performance regression against ' + args.baseline + ':', file=sys.stderr)
+            for line in regressions:
+                print('  ' + line, file=sys.stderr)
+            sys.exit(1)
+        print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%}).", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Microbenchmarks for each part of the serving path, on the same inputs.
+
+Times, in isolation:
+
+* decode: PIL full decode + resize vs. JPEG draft-mode decode + resize;
+* preprocess: Keras ``load_img``/``img_to_array`` vs. direct NumPy conversion;
+* inference: Keras ``predict`` vs. a direct model call vs. ``tf.function``
+  vs. TFLite vs. the NumPy forward pass, at each batch size;
+
+once per thread count. Every thread count runs in a fresh subprocess, because
+TensorFlow and BLAS fix their thread pools at start-up. Results are printed
+as a table of means with 95% confidence intervals.
+
+Run from Frontend-code/:
+
+    python -m bench.microbench --threads 1 2 4 --batch-sizes 1 8 32 64 --repeat 20
+"""
+import argparse
+import io
+import json
+import math
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(FRONTEND_DIR, 'static')
+THREAD_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS')
+# Two-sided 95% Student t critical values by sample size.
+T_CRITICAL = {2: 12.706, 3: 4.303, 4: 3.182, 5: 2.776, 6: 2.571, 7: 2.447, 8: 2.365, 9: 2.306,
+              10: 2.262, 15: 2.145, 20: 2.093, 30: 2.045, 60: 2.001, 120: 1.980}
+
+
+def t_critical(n):
+    eligible = [k for k in T_CRITICAL if k <= n]
+    return T_CRITICAL[max(eligible)] if eligible else float('nan')
+
+
+def summarize(samples):
+    mean = statistics.fmean(samples)
+    ci = t_critical(len(samples)) * statistics.stdev(samples) / math.sqrt(len(samples)) if len(samples) > 1 else float('nan')
+    return mean, ci
+
+
+def measure(fn, repeat, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def load_corpus(limit):
+    from PIL import Image
+    corpus = []
+    for name in sorted(os.listdir(STATIC_DIR)):
+        if not name.lower().endswith(('.jpg', '.jpeg', '.png')):
+            continue
+        path = os.path.join(STATIC_DIR, name)
+        with Image.open(path) as img:
+            if img.mode != 'L':
+                continue
+        with open(path, 'rb') as f:
+            corpus.append((path, f.read()))
+        if len(corpus) == limit:
+            break
+    return corpus
+
+
+def bench_decode(corpus, size, repeat):
+    from PIL import Image
+
+    def full():
+        for _, data in corpus:
+            with Image.open(io.BytesIO(data)) as img:
+                img.load()
+                img.resize((size, size), Image.NEAREST)
+
+    def draft():
+        for _, data in corpus:
+            with Image.open(io.BytesIO(data)) as img:
+                # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale.
+                img.draft('L', (size, size))
+                img.load()
+                img.resize((size, size), Image.NEAREST)
+
+    return [
+        ('decode', 'PIL full decode', 1, measure(full, repeat), len(corpus)),
+        ('decode', 'PIL draft decode', 1, measure(draft, repeat), len(corpus)),
+    ]
+
+
+def bench_preprocess(corpus, size, repeat):
+    from preprocessing import load_tensor
+    rows = []
+    try:
+        from tensorflow.keras.utils import img_to_array, load_img
+    except ImportError:
+        img_to_array = load_img = None
+    if load_img is not None:
+        def keras_path():
+            for path, _ in corpus:
+                x = img_to_array(load_img(path, target_size=(size, size), color_mode='grayscale'))
+                x /= 255.0
+
+        rows.append(('preprocess', 'load_img + img_to_array', 1, measure(keras_path, repeat), len(corpus)))
+
+    def numpy_path():
+        for path, _ in corpus:
+            load_tensor(path, (size, size))
+
+    rows.append(('preprocess', 'PIL + NumPy', 1, measure(numpy_path, repeat), len(corpus)))
+    return rows
+
+
+def bench_inference(model_path, batch_sizes, repeat, threads, skip):
+    import numpy as np
+    from keras.models import load_model
+    from bench.backends import inference_backends
+
+    model = load_model(model_path)
+    shape = tuple(model.input_shape[1:])
+    backends = inference_backends(model, threads, skip)
+    rows = []
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        x = rng.random((batch_size,) + shape, dtype=np.float32)
+        for name, run in backends.items():
+            rows.append(('inference', name, batch_size, measure(lambda: run(x), repeat), batch_size))
+    return rows
+
+
+def child(args):
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(args.child_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1 if args.child_threads == 1 else 2)
+    sys.path.insert(0, FRONTEND_DIR)
+    corpus = load_corpus(args.images)
+    rows = []
+    if 'decode' not in args.skip:
+        rows += bench_decode(corpus, args.size, args.repeat)
+    if 'preprocess' not in args.skip:
+        rows += bench_preprocess(corpus, args.size, args.repeat)
+    if 'inference' not in args.skip:
+        rows += bench_inference(args.model, args.batch_sizes, args.repeat, args.child_threads, args.skip)
+    # TensorFlow and the TFLite converter print to stdout, so results go to a file.
+    with open(args.child_output, 'w') as f:
+        json.dump([
+            {'threads': args.child_threads, 'group': group, 'variant': variant, 'batch': batch, 'samples': samples, 'items': items}
+            for group, variant, batch, samples, items in rows
+        ], f)
+
+
+def print_table(rows):
+    header = f"{'threads':>7}  {'group':<10}  {'variant':<24}  {'batch':>5}  {'mean ms':>9}  {'± 95% CI':>9}  {'ms/item':>8}  {'n':>3}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        mean, ci = summarize(row['samples'])
+        print(f"{row['threads']:>7}  {row['group']:<10}  {row['variant']:<24}  {row['batch']:>5}  "
+              f"{mean * 1000:>9.2f}  {ci * 1000:>9.2f}  {mean * 1000 / row['items']:>8.2f}  {len(row['samples']):>3}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='models/pneu_cnn_model.h5')
+    parser.add_argument('--size', type=int, default=500, help='Target size for the decode and preprocess groups.')
+    parser.add_argument('--images', type=int, default=8, help='Number of static/ X-rays in the decode corpus.')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, os.cpu_count()])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--skip', nargs='*', default=[], help='Groups or variants to skip, e.g. tflite "numpy forward".')
+    parser.add_argument('--json', help='Also write the raw samples to this file.')
+    parser.add_argument('--child-threads', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_threads:
+        child(args)
+        return
+
+    rows = []
+    for threads in args.threads:
+        env = dict(os.environ, **{name: str(threads) for name in THREAD_ENV}, TF_CPP_MIN_LOG_LEVEL='2')
+        output = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+        command = [sys.executable, '-m', 'bench.microbench', '--child-threads', str(threads), '--child-output', output,
+                   '--model', args.model, '--size', str(args.size), '--images', str(args.images),
+                   '--repeat', str(args.repeat), '--batch-sizes', *map(str, args.batch_sizes), '--skip', *args.skip]
+        print(f"Running with {threads} thread(s)...", file=sys.stderr)
+        try:
+            subprocess.run(command, cwd=FRONTEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+            with open(output) as f:
+                rows += json.load(f)
+        finally:
+            os.remove(output)
+
+    print_table(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
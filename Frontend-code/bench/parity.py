@@ -0,0 +1,186 @@
+"""Numerical-parity harness for optimized inference paths.
+
+``record`` scores a fixed corpus (the grayscale X-rays in static/ plus
+deterministic synthetic images) with the reference path, the Keras model's
+``predict`` on serving preprocessing, and stores the probabilities as golden
+outputs. ``check`` re-scores the corpus with every inference backend and
+preprocessing variant registered in bench/backends.py and reports the maximum
+absolute error, the decisions that flip at the 0.5 and 0.2 thresholds, and
+the latency against the reference. It exits 1 if any variant fails;
+approximate preprocessing variants such as ``draft`` are reported for
+information only, unless they are named with ``--preprocess``.
+
+Run from Frontend-code/:
+
+    python -m bench.parity record
+    python -m bench.parity check
+    python -m bench.parity check --backend tflite --preprocess serving draft --tolerance 1e-3
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(FRONTEND_DIR, 'static')
+THRESHOLDS = (0.5, 0.2)  # decision threshold and health-advice threshold in app.py
+REFERENCE_BACKEND = 'keras predict'
+REFERENCE_PREPROCESSING = 'serving'
+
+
+def synthetic_images():
+    """Deterministic grayscale images at a non-square size, encoded as PNG."""
+    height, width = 512, 640
+    rng = np.random.default_rng(20240601)
+    yy, xx = np.mgrid[0:height, 0:width]
+    arrays = {
+        'black': np.zeros((height, width)),
+        'white': np.full((height, width), 255),
+        'gradient-h': xx / (width - 1) * 255,
+        'gradient-v': yy / (height - 1) * 255,
+        'checkerboard': ((yy // 32 + xx // 32) % 2) * 255,
+        'disc': (((yy - height / 2) ** 2 + (xx - width / 2) ** 2) < (height / 3) ** 2) * 200 + 30,
+    }
+    for i in range(4):
+        arrays[f"noise-{i}"] = rng.integers(0, 256, (height, width))
+    images = []
+    for name, array in arrays.items():
+        buffer = io.BytesIO()
+        Image.fromarray(array.astype(np.uint8), 'L').save(buffer, format='PNG')
+        images.append((f"synthetic/{name}", buffer.getvalue()))
+    return images
+
+
+def load_corpus():
+    corpus = []
+    for name in sorted(os.listdir(STATIC_DIR)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            data = f.read()
+        with Image.open(io.BytesIO(data)) as img:
+            if img.mode != 'L':
+                continue  # /predict rejects these before scoring
+        corpus.append((f"static/{name}", data))
+    return corpus + synthetic_images()
+
+
+def score(corpus, preprocess, run, target_size):
+    probabilities, latencies = [], []
+    for _, data in corpus:
+        x = preprocess(data, target_size)
+        start = time.perf_counter()
+        probabilities.append(float(np.asarray(run(x)).reshape(-1)[0]))
+        latencies.append(time.perf_counter() - start)
+    return np.array(probabilities), latencies
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def record(args):
+    from keras.models import load_model
+    from bench.backends import PREPROCESSING, inference_backends
+
+    model = load_model(args.model)
+    target_size = tuple(model.input_shape[1:3])
+    corpus = load_corpus()
+    run = inference_backends(model, skip=('tflite',))[REFERENCE_BACKEND]
+    run(PREPROCESSING[REFERENCE_PREPROCESSING](corpus[0][1], target_size))  # warm-up
+    probabilities, latencies = score(corpus, PREPROCESSING[REFERENCE_PREPROCESSING], run, target_size)
+    golden = {
+        'model': args.model,
+        'model_sha256': file_sha256(args.model),
+        'input_shape': list(model.input_shape[1:]),
+        'reference': {'backend': REFERENCE_BACKEND, 'preprocessing': REFERENCE_PREPROCESSING},
+        'mean_latency_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'images': [
+            {'id': image_id, 'sha256': hashlib.sha256(data).hexdigest(), 'probability': probability}
+            for (image_id, data), probability in zip(corpus, probabilities.tolist())
+        ],
+    }
+    with open(args.golden, 'w') as f:
+        json.dump(golden, f, indent=2)
+    print(f"Recorded {len(corpus)} golden outputs to {args.golden}.")
+
+
+def compare(golden_probabilities, probabilities):
+    errors = np.abs(probabilities - golden_probabilities)
+    flips = {threshold: int(np.sum((probabilities >= threshold) != (golden_probabilities >= threshold))) for threshold in THRESHOLDS}
+    return float(errors.max()), float(errors.mean()), flips
+
+
+def check(args):
+    from keras.models import load_model
+    from bench.backends import APPROXIMATE_PREPROCESSING, PREPROCESSING, inference_backends
+
+    with open(args.golden) as f:
+        golden = json.load(f)
+    if file_sha256(args.model) != golden['model_sha256']:
+        sys.exit(f"{args.model} is not the model the golden outputs were recorded with; run `record` again.")
+    corpus = load_corpus()
+    expected = {image['id']: image for image in golden['images']}
+    if [image_id for image_id, _ in corpus] != list(expected) or any(
+            hashlib.sha256(data).hexdigest() != expected[image_id]['sha256'] for image_id, data in corpus):
+        sys.exit("The corpus has changed since the golden outputs were recorded; run `record` again.")
+    golden_probabilities = np.array([image['probability'] for image in golden['images']])
+
+    model = load_model(args.model)
+    target_size = tuple(model.input_shape[1:3])
+    backends = inference_backends(model, skip=args.skip)
+    variants = [(name, REFERENCE_PREPROCESSING) for name in (args.backend or backends)]
+    variants += [(REFERENCE_BACKEND, name) for name in (args.preprocess or PREPROCESSING) if name != REFERENCE_PREPROCESSING]
+
+    reference_ms = golden['mean_latency_ms']
+    header = f"{'backend':<16}  {'preprocessing':<13}  {'max abs err':>11}  {'mean abs err':>12}  {'flips@0.5':>9}  {'flips@0.2':>9}  {'ms/img':>7}  {'speedup':>7}  result"
+    print(f"{len(corpus)} images; reference {golden['reference']['backend']} / {golden['reference']['preprocessing']} at {reference_ms:.2f} ms/img")
+    print(header)
+    print('-' * len(header))
+    failed = False
+    for backend, preprocessing in variants:
+        if backend not in backends or preprocessing not in PREPROCESSING:
+            print(f"{backend:<16}  {preprocessing:<13}  unavailable")
+            failed = True
+            continue
+        run = backends[backend]
+        run(PREPROCESSING[preprocessing](corpus[0][1], target_size))  # warm-up
+        probabilities, latencies = score(corpus, PREPROCESSING[preprocessing], run, target_size)
+        max_error, mean_error, flips = compare(golden_probabilities, probabilities)
+        mean_ms = statistics.fmean(latencies) * 1000
+        ok = max_error <= args.tolerance and sum(flips.values()) <= args.max_flips
+        if preprocessing in APPROXIMATE_PREPROCESSING and not args.preprocess:
+            result = 'ok' if ok else 'info'
+        else:
+            result = 'ok' if ok else 'FAIL'
+            failed |= not ok
+        print(f"{backend:<16}  {preprocessing:<13}  {max_error:>11.2e}  {mean_error:>12.2e}  {flips[0.5]:>9}  {flips[0.2]:>9}  "
+              f"{mean_ms:>7.2f}  {reference_ms / mean_ms:>6.2f}x  {result}")
+    sys.exit(1 if failed else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=('record', 'check'))
+    parser.add_argument('--model', default='models/pneu_cnn_model.h5')
+    parser.add_argument('--golden', default='bench/golden.json')
+    parser.add_argument('--backend', nargs='+', help='Backends to check (default: all available).')
+    parser.add_argument('--preprocess', nargs='+', help='Preprocessing variants to check (default: all).')
+    parser.add_argument('--skip', nargs='*', default=[], help='Backends to leave out, e.g. tflite.')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='Largest acceptable absolute error.')
+    parser.add_argument('--max-flips', type=int, default=0, help='Largest acceptable number of decision flips.')
+    args = parser.parse_args()
+    sys.path.insert(0, FRONTEND_DIR)
+    record(args) if args.command == 'record' else check(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Startup profile for the Flask app, checked against the startup budget.
+
+Imports app.py in a fresh interpreter under ``python -X importtime``, serves
+the index page once, and waits for the background model loader. Reports the
+time from spawning the interpreter to each milestone, the modules with the largest cumulative import time
+and the self time by top-level package, and exits 1 if a milestone is over
+budget.
+
+Run from Frontend-code/:
+
+    python -m bench.startup
+    SERVING_BACKEND=numpy MODEL_PATH=models/pneu_cnn_model.flat.json python -m bench.startup --budget-models-ready 1
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+FRONTEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+# Seconds from spawning the interpreter, so its own startup counts too. The
+# README documents these.
+BUDGET = {'import_app': 1.0, 'first_response': 1.0, 'models_ready': 15.0}
+
+CHILD = r'''
+import json, sys, time
+started = float(sys.argv[3])  # wall-clock time at which the parent spawned this process
+import app
+imported = time.time()
+response = app.app.test_client().get('/')
+served = time.time()
+ready = app.models_ready.wait(float(sys.argv[2]))
+loaded = time.time()
+with open(sys.argv[1], 'w') as f:
+    json.dump({'import_app': imported - started, 'first_response': served - started,
+               'models_ready': loaded - started if ready else None, 'index_status': response.status_code,
+               'model_load_error': app.model_load_error}, f)
+'''
+
+
+def parse_importtime(stderr):
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({'module': name, 'self_s': int(self_us) / 1e6, 'cumulative_s': int(cumulative_us) / 1e6, 'depth': len(indent) // 2})
+    return modules
+
+
+def by_package(modules):
+    totals = {}
+    for module in modules:
+        package = module['module'].split('.')[0]
+        totals[package] = totals.get(package, 0.0) + module['self_s']
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top', type=int, default=15, help='Modules and packages to list.')
+    parser.add_argument('--timeout', type=float, default=120.0, help='Seconds to wait for the models.')
+    for milestone, seconds in BUDGET.items():
+        parser.add_argument(f"--budget-{milestone.replace('_', '-')}", type=float, default=seconds, dest=f"budget_{milestone}")
+    parser.add_argument('--json', help='Also write the profile to this file.')
+    args = parser.parse_args()
+
+    output = tempfile.NamedTemporaryFile(suffix='.json', delete=False).name
+    try:
+        child = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, output, str(args.timeout), repr(time.time())],
+                               cwd=FRONTEND_DIR, env=dict(os.environ, TF_CPP_MIN_LOG_LEVEL='2'),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if child.returncode != 0:
+            sys.exit(child.stderr[-2000:])
+        with open(output) as f:
+            milestones = json.load(f)
+    finally:
+        os.remove(output)
+    modules = parse_importtime(child.stderr)
+
+    print(f"{'milestone':<16}  {'seconds':>8}  {'budget':>7}  result")
+    over = []
+    for milestone in BUDGET:
+        seconds, budget = milestones[milestone], getattr(args, f"budget_{milestone}")
+        ok = seconds is not None and seconds <= budget
+        if not ok:
+            over.append(milestone)
+        shown = f"{seconds:>8.3f}" if seconds is not None else f"{'timeout':>8}"
+        print(f"{milestone:<16}  {shown}  {budget:>7.2f}  {'ok' if ok else 'OVER'}")
+    if milestones['model_load_error']:
+        print(f"Model loading failed: {milestones['model_load_error']}")
+
+    print(f"\nLargest cumulative import times ({len(modules)} modules imported):")
+    for module in sorted(modules, key=lambda m: m['cumulative_s'], reverse=True)[:args.top]:
+        print(f"  {module['cumulative_s']:>8.3f}s  {'  ' * module['depth']}{module['module']}")
+    print('\nSelf time by top-level package:')
+    for package, seconds in by_package(modules)[:args.top]:
+        print(f"  {seconds:>8.3f}s  {package}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'milestones': milestones, 'modules': modules}, f, indent=2)
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main()
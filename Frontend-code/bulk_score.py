@@ -0,0 +1,281 @@
+"""Score a folder, zip or tar archive of X-rays offline with the serving model.
+
+Images are read straight from the directory or archive (nothing is extracted
+to disk), decoded and resized in a pool of worker processes, and scored in
+batches by the model the registry currently serves. Every finished batch is
+appended to ``<output>.partial.jsonl``; if the run is interrupted, running the
+same command again skips the images already scored. The results are written
+as CSV, JSON Lines or Parquet (chosen by the output's extension), followed by
+the throughput of each stage.
+
+    python bulk_score.py chest_xray/test results.csv
+    python bulk_score.py studies.zip results.parquet --workers 8 --batch-size 64
+    SERVING_BACKEND=numpy MODEL_PATH=models/pneu_cnn_model.flat.json python bulk_score.py scans.tar.gz results.jsonl
+"""
+import argparse
+import collections
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import normalize, resize_pixels
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+LABELS = ('NORMAL', 'PNEUMONIA')  # class folders of the chest_xray layout
+FIELDS = ('name', 'sha256', 'label', 'score', 'prediction', 'model_version', 'error')
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+
+def iter_source(source, skip=frozenset()):
+    """Yield ``(name, bytes)`` for every image in a directory, zip or tar archive.
+
+    Names are relative to the source. Names in ``skip`` are not read.
+    """
+    wanted = lambda name: name.lower().endswith(IMAGE_EXTENSIONS) and name not in skip
+    if os.path.isdir(source):
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, source).replace(os.sep, '/')
+                if wanted(name):
+                    with open(path, 'rb') as f:
+                        yield name, f.read()
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and wanted(info.filename):
+                    yield info.filename, archive.read(info)
+    elif tarfile.is_tarfile(source):
+        # Stream mode reads compressed tars front to back without seeking.
+        with tarfile.open(source, 'r|*') as archive:
+            for member in archive:
+                if member.isfile() and wanted(member.name):
+                    yield member.name, archive.extractfile(member).read()
+    else:
+        raise SystemExit(f"{source} is not a directory, zip or tar archive.")
+
+
+def label_for(name):
+    parts = name.split('/')
+    return next((part for part in reversed(parts[:-1]) if part in LABELS), None)
+
+
+def decode(item):
+    """Runs in a worker process: hash, decode and resize one image.
+
+    Like ``/predict``, only grayscale (mode ``L``) images are scored; any
+    other image becomes an error row.
+    """
+    name, data, target_size = item
+    start = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.mode != 'L':
+                pixels, error = None, f"Not a grayscale X-ray image (mode {img.mode})."
+            else:
+                pixels, error = resize_pixels(img, target_size), None
+    except Exception as e:
+        pixels, error = None, f"{type(e).__name__}: {e}"
+    return name, hashlib.sha256(data).hexdigest(), pixels, error, time.perf_counter() - start
+
+
+def bounded_map(executor, fn, items, window):
+    """``executor.map`` that keeps at most ``window`` items in flight, in order."""
+    pending = collections.deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class StageStats:
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.images = collections.defaultdict(int)
+        self.bytes_read = 0
+
+    def add(self, stage, seconds, images=1):
+        self.seconds[stage] += seconds
+        self.images[stage] += images
+
+    def timed(self, items, stage):
+        """Yield from ``items``, charging the time spent producing each one to ``stage``."""
+        items = iter(items)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            self.add(stage, time.perf_counter() - start)
+            self.bytes_read += len(item[1])
+            yield item
+
+    def report(self, workers, wall_seconds, scored):
+        lines = [f"{'stage':<10}  {'images':>8}  {'seconds':>9}  {'images/s':>9}"]
+        for stage, seconds in self.seconds.items():
+            # Decoding runs in parallel; its seconds are summed over the workers.
+            effective = seconds / workers if stage == 'decode' else seconds
+            rate = self.images[stage] / effective if effective else float('inf')
+            lines.append(f"{stage:<10}  {self.images[stage]:>8}  {seconds:>9.2f}  {rate:>9.1f}")
+        lines.append(f"{'total':<10}  {scored:>8}  {wall_seconds:>9.2f}  {scored / wall_seconds if wall_seconds else 0:>9.1f}")
+        lines.append(f"Read {self.bytes_read / 2**20:.1f} MiB; decode time is summed over {workers} worker processes.")
+        return '\n'.join(lines)
+
+
+def open_checkpoint(path, source, model_version, restart):
+    """The names already scored by an interrupted run, and the checkpoint file to append to."""
+    header = {'source': os.path.abspath(source), 'model_version': model_version}
+    if restart or not os.path.exists(path):
+        f = open(path, 'w')
+        f.write(json.dumps(header) + '\n')
+        return set(), f
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if not lines or json.loads(lines[0]) != header:
+        raise SystemExit(f"{path} was written for a different source or model version; pass --restart to start over.")
+    done = set()
+    for line in lines[1:]:
+        try:
+            done.add(json.loads(line)['name'])
+        except ValueError:
+            break  # a row cut short by the interruption
+    # Rewrite without any partial last line before appending to it.
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines[:len(done) + 1]) + '\n')
+    return done, open(path, 'a')
+
+
+def read_rows(checkpoint_path):
+    with open(checkpoint_path) as f:
+        next(f)
+        return [json.loads(line) for line in f]
+
+
+def write_output(rows, output, output_format):
+    temp_path = output + '.tmp'
+    if output_format == 'csv':
+        with open(temp_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif output_format == 'jsonl':
+        with open(temp_path, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+    else:
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), temp_path)
+    os.replace(temp_path, output)
+
+
+def load_serving_version(backend):
+    from registry import ModelRegistry
+    if backend == 'numpy':
+        from numpy_backend import load_model
+    else:
+        from keras.models import load_model
+    registry = ModelRegistry(
+        os.environ.get('MODEL_REGISTRY_DIR', 'models/registry'),
+        os.environ.get('MODEL_PATH', 'models/pneu_cnn_model.h5'),
+        load_model, poll_interval=0, warmup=False,
+    )
+    return registry.current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='Directory, .zip or .tar[.gz|.bz2|.xz] of PNG/JPEG images.')
+    parser.add_argument('output', help='Results file: .csv, .jsonl or .parquet.')
+    parser.add_argument('--format', choices=FORMATS, help='Output format (default: from the extension).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Decode processes.')
+    parser.add_argument('--batch-size', type=int, default=32, help='Images per forward pass.')
+    parser.add_argument('--backend', choices=('keras', 'numpy'), default=os.environ.get('SERVING_BACKEND', 'keras'))
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an earlier run.')
+    args = parser.parse_args()
+
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in FORMATS:
+        parser.error(f"cannot tell the format of {args.output}; pass --format")
+    if output_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        sys.exit('Writing Parquet needs pyarrow: pip install pyarrow')
+
+    current = load_serving_version(args.backend)
+    checkpoint_path = args.output + '.partial.jsonl'
+    done, checkpoint = open_checkpoint(checkpoint_path, args.source, current.version, args.restart)
+    if done:
+        print(f"Resuming: {len(done)} images already scored.", file=sys.stderr)
+
+    stats = StageStats()
+    target_size = current.tier.target_size
+    start = time.perf_counter()
+    scored = 0
+    batch, rows = [], []
+
+    def flush():
+        nonlocal scored
+        if batch:
+            t = time.perf_counter()
+            scores = current.tier.model.predict(np.concatenate([x for _, x in batch]), batch_size=len(batch), verbose=0)[:, 0]
+            stats.add('inference', time.perf_counter() - t, len(batch))
+            for (row, _), score in zip(batch, scores.tolist()):
+                row.update(score=score, prediction='positive' if score >= current.threshold else 'negative')
+        t = time.perf_counter()
+        for row, _ in batch:
+            rows.append(row)
+        for row in rows:
+            checkpoint.write(json.dumps(row) + '\n')
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        stats.add('checkpoint', time.perf_counter() - t, len(rows))
+        scored += len(rows)
+        batch.clear()
+        rows.clear()
+        elapsed = time.perf_counter() - start
+        print(f"\r{scored} images scored, {scored / elapsed:.1f}/s", end='', file=sys.stderr, flush=True)
+
+    # Spawned workers only import PIL and NumPy, never the model's runtime.
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        items = ((name, data, target_size) for name, data in stats.timed(iter_source(args.source, done), 'read'))
+        for name, sha256, pixels, error, seconds in bounded_map(executor, decode, items, args.workers * 4):
+            stats.add('decode', seconds)
+            row = {'name': name, 'sha256': sha256, 'label': label_for(name), 'score': None,
+                   'prediction': None, 'model_version': current.version, 'error': error}
+            if pixels is None:
+                rows.append(row)
+            else:
+                batch.append((row, normalize(pixels)))
+            if len(batch) >= args.batch_size:
+                flush()
+        flush()
+    checkpoint.close()
+    print(file=sys.stderr)
+
+    t = time.perf_counter()
+    results = read_rows(checkpoint_path)
+    write_output(results, args.output, output_format)
+    stats.add('write', time.perf_counter() - t, len(results))
+    os.remove(checkpoint_path)
+    errors = sum(1 for row in results if row['error'])
+    print(f"Wrote {len(results)} results ({errors} not scored) to {args.output} with model version {current.version}.")
+    print(stats.report(args.workers, time.perf_counter() - start, scored))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import os
+import threading
+
+from metrics import stage
+from preprocessing import to_tensor
+
+SCREEN = 'screen'
+
+
+class Cascade:
+    """Two-stage scoring: a tiny screening model first, the full model only when unsure.
+
+    The screening score settles the request on its own when it falls outside
+    ``[low, high]``; scores inside the band are escalated to the full model.
+    """
+
+    def __init__(self, screen, low=0.15, high=0.85):
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError(f"Invalid cascade band [{low}, {high}]")
+        self.screen = screen
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self.screened = 0
+        self.escalated = 0
+
+    def in_band(self, score):
+        return self.low <= score <= self.high
+
+    def run(self, img, full, x=None):
+        """Score a decoded image, returning ``(score, tier that produced it)``.
+
+        ``x`` is the image already preprocessed for ``full``, if the caller has it.
+        """
+        with stage('resize'):
+            screen_x = to_tensor(img, self.screen.target_size)
+        with stage('screen_inference'):
+            score = float(self.screen.model.predict(screen_x, verbose=0)[0][0])
+        escalate = self.in_band(score)
+        with self._lock:
+            self.screened += 1
+            if escalate:
+                self.escalated += 1
+        if not escalate:
+            return score, self.screen
+        if x is None:
+            with stage('resize'):
+                x = to_tensor(img, full.target_size)
+        with stage('inference'):
+            score = float(full.model.predict(x, verbose=0)[0][0])
+        return score, full
+
+    def snapshot(self):
+        with self._lock:
+            screened, escalated = self.screened, self.escalated
+        return {
+            'band': [self.low, self.high],
+            'screened': screened,
+            'escalated': escalated,
+            'screen_hit_rate': round((screened - escalated) / screened, 4) if screened else None,
+            'escalation_rate': round(escalated / screened, 4) if screened else None,
+        }
+
+
+def band_from_env():
+    return float(os.environ.get('CASCADE_LOW', 0.15)), float(os.environ.get('CASCADE_HIGH', 0.85))
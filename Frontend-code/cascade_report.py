@@ -0,0 +1,126 @@
+"""Offline accuracy/latency report for the screening cascade.
+
+Scores a labelled folder (the ``chest_xray/test`` layout from the notebook,
+with ``NORMAL/`` and ``PNEUMONIA/`` sub-directories) with both the screening
+model and the full model once, then replays each candidate uncertainty band
+against those scores and compares it with running the full model on everything.
+
+    python cascade_report.py chest_xray/test --band 0.15 0.85 --band 0.1 0.9
+"""
+import argparse
+import json
+import os
+import time
+
+from PIL import Image
+from keras.models import load_model
+
+from preprocessing import to_tensor
+
+LABELS = {'NORMAL': 0, 'PNEUMONIA': 1}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def iter_labelled_images(data_dir):
+    for class_name, label in LABELS.items():
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(class_dir, name), label
+
+
+def timed_score(model, x):
+    start = time.perf_counter()
+    score = float(model.predict(x, verbose=0)[0][0])
+    return score, time.perf_counter() - start
+
+
+def collect(data_dir, screen_model, screen_size, full_model, full_size):
+    rows = []
+    for path, label in iter_labelled_images(data_dir):
+        with Image.open(path) as img:
+            screen_score, screen_time = timed_score(screen_model, to_tensor(img, screen_size))
+            full_score, full_time = timed_score(full_model, to_tensor(img, full_size))
+        rows.append({
+            'path': path,
+            'label': label,
+            'screen_score': screen_score,
+            'screen_seconds': screen_time,
+            'full_score': full_score,
+            'full_seconds': full_time,
+        })
+    return rows
+
+
+def evaluate_band(rows, low, high):
+    correct = 0
+    escalated = 0
+    seconds = 0.0
+    for row in rows:
+        seconds += row['screen_seconds']
+        score = row['screen_score']
+        if low <= score <= high:
+            escalated += 1
+            seconds += row['full_seconds']
+            score = row['full_score']
+        correct += int((score >= 0.5) == bool(row['label']))
+    n = len(rows)
+    return {
+        'band': [low, high],
+        'accuracy': correct / n,
+        'screen_hit_rate': (n - escalated) / n,
+        'escalation_rate': escalated / n,
+        'mean_latency_seconds': seconds / n,
+    }
+
+
+def evaluate_full(rows):
+    n = len(rows)
+    correct = sum(int((row['full_score'] >= 0.5) == bool(row['label'])) for row in rows)
+    return {
+        'accuracy': correct / n,
+        'mean_latency_seconds': sum(row['full_seconds'] for row in rows) / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('data_dir', help='Directory with NORMAL/ and PNEUMONIA/ sub-directories.')
+    parser.add_argument('--screen-model', default='models/pneu_cnn_model_screen.h5')
+    parser.add_argument('--screen-size', type=int, default=128)
+    parser.add_argument('--full-model', default='models/pneu_cnn_model.h5')
+    parser.add_argument('--full-size', type=int, default=500)
+    parser.add_argument('--band', nargs=2, type=float, action='append', metavar=('LOW', 'HIGH'),
+                        help='Uncertainty band to evaluate; may be repeated. Defaults to 0.15 0.85.')
+    parser.add_argument('--json', help='Also write the report to this file as JSON.')
+    args = parser.parse_args()
+
+    rows = collect(
+        args.data_dir,
+        load_model(args.screen_model), (args.screen_size, args.screen_size),
+        load_model(args.full_model), (args.full_size, args.full_size),
+    )
+    if not rows:
+        parser.error(f"No labelled images found under {args.data_dir}")
+
+    baseline = evaluate_full(rows)
+    bands = [evaluate_band(rows, low, high) for low, high in (args.band or [(0.15, 0.85)])]
+
+    print(f"{len(rows)} images")
+    print(f"{'mode':<18}{'accuracy':>10}{'screen hits':>13}{'escalated':>11}{'mean ms':>10}{'speedup':>9}")
+    print(f"{'full only':<18}{baseline['accuracy']:>10.4f}{'-':>13}{'-':>11}{baseline['mean_latency_seconds'] * 1000:>10.1f}{1.0:>9.2f}")
+    for result in bands:
+        low, high = result['band']
+        speedup = baseline['mean_latency_seconds'] / result['mean_latency_seconds']
+        print(f"{f'cascade {low:.2f}-{high:.2f}':<18}{result['accuracy']:>10.4f}{result['screen_hit_rate']:>13.2%}"
+              f"{result['escalation_rate']:>11.2%}{result['mean_latency_seconds'] * 1000:>10.1f}{speedup:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'images': len(rows), 'full': baseline, 'cascade': bands}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import json
+import math
+import os
+
+# Thread-pool sizes are read from these when TensorFlow and BLAS start, so the
+# plan has to be applied to the environment before the app imports keras.
+THREAD_ENV = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS')
+
+
+def cgroup_cpu_limit():
+    """CPUs allowed by the container's CFS quota, or None when unlimited."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:  # cgroup v2
+            quota, period = f.read().split()
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:  # cgroup v1
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus():
+    """The CPUs this process may run on and how many of them it can keep busy."""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    limit = cgroup_cpu_limit()
+    usable = len(cpus) if limit is None else max(1, min(len(cpus), math.ceil(limit)))
+    return cpus, usable
+
+
+class CpuPlan:
+    """How many workers to run and how many compute threads each one gets.
+
+    The product of ``workers`` and ``intra_op_threads`` is kept at the number
+    of usable cores so that workers don't oversubscribe the machine. With
+    ``pin`` set, worker slot ``i`` is restricted to its own ``intra_op_threads``
+    cores, taken in order from the CPUs this process may run on.
+    """
+
+    def __init__(self, workers, intra_op_threads, inter_op_threads, cpus, usable_cpus, pin=False):
+        self.workers = workers
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.cpus = cpus
+        self.usable_cpus = usable_cpus
+        self.pin = pin
+
+    def cores_for(self, slot):
+        count = self.intra_op_threads
+        start = slot * count % len(self.cpus)
+        return [self.cpus[(start + i) % len(self.cpus)] for i in range(min(count, len(self.cpus)))]
+
+    def apply_env(self, environ=os.environ):
+        for name in THREAD_ENV:
+            environ[name] = str(self.intra_op_threads)
+        environ['TF_NUM_INTEROP_THREADS'] = str(self.inter_op_threads)
+        environ['CPU_PLAN'] = json.dumps(self.snapshot())
+
+    def pin_worker(self, slot):
+        cores = self.cores_for(slot)
+        os.sched_setaffinity(0, cores)
+        return cores
+
+    def snapshot(self):
+        return {
+            'workers': self.workers,
+            'intra_op_threads': self.intra_op_threads,
+            'inter_op_threads': self.inter_op_threads,
+            'cpus': self.cpus,
+            'usable_cpus': self.usable_cpus,
+            'pin': self.pin,
+        }
+
+
+def plan(usable_cpus, cpus, workers=None, threads_per_worker=None, pin=False):
+    if workers and not threads_per_worker:
+        threads_per_worker = max(1, usable_cpus // workers)
+    # Two threads per worker keeps single-image latency down without giving
+    # up much throughput; a small box runs one single-threaded worker per core.
+    threads_per_worker = max(1, min(threads_per_worker or (2 if usable_cpus >= 4 else 1), usable_cpus))
+    workers = workers or max(1, usable_cpus // threads_per_worker)
+    # The served CNN is a single chain of ops, so inter-op parallelism buys nothing.
+    return CpuPlan(workers, threads_per_worker, 1, cpus, usable_cpus, pin=pin and hasattr(os, 'sched_setaffinity'))
+
+
+def plan_from_env():
+    cpus, usable = available_cpus()
+    return plan(
+        usable, cpus,
+        workers=int(os.environ.get('GUNICORN_WORKERS', 0)) or None,
+        threads_per_worker=int(os.environ.get('CPU_THREADS_PER_WORKER', 0)) or None,
+        pin=os.environ.get('CPU_PIN_WORKERS') == '1',
+    )
+
+
+def current_plan():
+    """The plan the gunicorn master applied, or one derived here when run without it."""
+    status = json.loads(os.environ['CPU_PLAN']) if 'CPU_PLAN' in os.environ else plan_from_env().snapshot()
+    if hasattr(os, 'sched_getaffinity'):
+        status['worker_cpus'] = sorted(os.sched_getaffinity(0))
+    return status
+
+
+if __name__ == '__main__':
+    print(json.dumps(plan_from_env().snapshot(), indent=2))
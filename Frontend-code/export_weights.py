@@ -0,0 +1,37 @@
+"""Export a Keras model to the memory-mappable flat weight format.
+
+Writes ``<output>.json`` (layer specs, tensor offsets and shapes) and
+``<output>.bin`` (the weights as aligned little-endian float32), then maps the
+export back and checks that it reproduces the source model's outputs.
+
+    python export_weights.py models/pneu_cnn_model.h5
+    python export_weights.py models/pneu_cnn_model.h5 models/registry/2024-06-01/pneu_cnn_model.flat.json
+"""
+import argparse
+import os
+
+import numpy as np
+
+from numpy_backend import NumpyModel
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('model', help='Keras .h5 model to export.')
+    parser.add_argument('output', nargs='?', help='Manifest path (default: <model>.flat.json).')
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.model)[0] + '.flat.json'
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    model = NumpyModel.from_h5(args.model)
+    manifest = model.save_flat(output)
+    exported = NumpyModel.from_flat(output)
+    x = np.random.default_rng(0).random((2,) + model.input_shape[1:], dtype=np.float32)
+    error = float(np.abs(exported.predict(x) - model.predict(x)).max())
+    if error != 0.0:
+        raise SystemExit(f"Exported model differs from {args.model} by up to {error}")
+    print(f"Wrote {output} and {manifest['weights']} ({manifest['size'] / 2**20:.1f} MiB, sha256 {manifest['sha256'][:12]}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import io
+
+from PIL import Image
+import numpy as np
+import tensorflow as tf
+
+
+def last_conv_index(model):
+    for index in range(len(model.layers) - 1, -1, -1):
+        if isinstance(model.layers[index], tf.keras.layers.Conv2D):
+            return index
+    raise ValueError("Model has no Conv2D layer to explain.")
+
+
+def grad_cam(model, x):
+    """Grad-CAM for the last conv layer of a Sequential model.
+
+    The layers are applied one by one under a single gradient tape, so the
+    activations and the gradient of the output score with respect to them
+    come from one forward and one backward pass. Returns a (h, w) map in
+    [0, 1] at the resolution of the conv layer.
+    """
+    conv_index = last_conv_index(model)
+    with tf.GradientTape() as tape:
+        out = tf.convert_to_tensor(x)
+        for index, layer in enumerate(model.layers):
+            out = layer(out, training=False)
+            if index == conv_index:
+                conv_out = out
+                tape.watch(conv_out)
+        score = out[:, 0]
+    grads = tape.gradient(score, conv_out)[0]
+    weights = tf.reduce_mean(grads, axis=(0, 1))
+    cam = tf.nn.relu(tf.reduce_sum(conv_out[0] * weights, axis=-1)).numpy()
+    peak = cam.max()
+    return cam / peak if peak > 0 else cam
+
+
+def colorize(cam):
+    """Map [0, 1] values to a blue-green-red ramp as uint8 RGB."""
+    r = np.clip(1.5 - np.abs(4 * cam - 3), 0, 1)
+    g = np.clip(1.5 - np.abs(4 * cam - 2), 0, 1)
+    b = np.clip(1.5 - np.abs(4 * cam - 1), 0, 1)
+    return (np.stack([r, g, b], axis=-1) * 255).astype(np.uint8)
+
+
+def overlay_png(x, cam, size=224, alpha=0.4):
+    """Blend the heatmap over a downscaled copy of the input tensor as PNG bytes."""
+    base = Image.fromarray((x[0, :, :, 0] * 255).astype(np.uint8), 'L').resize((size, size), Image.BILINEAR).convert('RGB')
+    heat = Image.fromarray((cam * 255).astype(np.uint8), 'L').resize((size, size), Image.BILINEAR)
+    heat = Image.fromarray(colorize(np.asarray(heat, dtype=np.float32) / 255.0), 'RGB')
+    buffer = io.BytesIO()
+    Image.blend(base, heat, alpha).save(buffer, format='PNG')
+    return buffer.getvalue()
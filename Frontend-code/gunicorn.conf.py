@@ -0,0 +1,81 @@
+# Loaded by run.sh via `gunicorn -c gunicorn.conf.py`.
+import gc
+import glob
+import os
+
+from admission import controller_from_env
+from cpu_plan import plan_from_env
+from metrics import mark_process_dead
+
+# Size workers and their TensorFlow/BLAS thread pools to the cores actually
+# available. The environment is read by each worker when it imports the app.
+cpu_plan = plan_from_env()
+cpu_plan.apply_env()
+workers = cpu_plan.workers
+
+# Admission control can only shed requests that reach it. gthread hands each
+# accepted connection to a pool of `threads` and queues the rest inside the
+# worker, out of admission control's sight. So every worker gets a thread for
+# each inference slot and queue place, plus spare threads for health checks,
+# /metrics and job polls, and accepts no more connections than it has threads.
+# Connections beyond that wait in the socket backlog, where other workers can
+# accept them.
+worker_class = 'gthread'
+admission = controller_from_env()
+threads = int(os.environ.get('GUNICORN_THREADS', 0)) or \
+    admission.max_concurrency + admission.max_queue_depth + int(os.environ.get('GUNICORN_SPARE_THREADS', 4))
+worker_connections = threads
+# An idle keep-alive connection holds a connection slot, and its next request
+# would queue for a thread, so connections close after each response.
+keepalive = 0
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 64))
+
+# GUNICORN_PRELOAD=1 loads and warms the models once in the master and forks
+# the workers from it, so they share the weights copy-on-write. TensorFlow's
+# runtime does not survive fork, so preloading serves with the NumPy backend.
+preload_app = os.environ.get('GUNICORN_PRELOAD') == '1'
+if preload_app and os.environ.setdefault('SERVING_BACKEND', 'numpy') != 'numpy':
+    raise RuntimeError('GUNICORN_PRELOAD=1 requires SERVING_BACKEND=numpy')
+
+
+def on_starting(server):
+    server.log.info(f"CPU plan: {cpu_plan.snapshot()}")
+    server.log.info(f"{threads} threads and connections per worker for admission control's "
+                    f"{admission.max_concurrency} slots and {admission.max_queue_depth} queue places.")
+    if threads < admission.max_concurrency + admission.max_queue_depth:
+        server.log.warning(f"GUNICORN_THREADS={threads} is below ADMISSION_MAX_CONCURRENCY + ADMISSION_MAX_QUEUE_DEPTH; "
+                           f"requests will queue where admission control cannot shed them.")
+    # Samples from a previous run would otherwise be aggregated into /metrics.
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def when_ready(server):
+    if preload_app:
+        # Everything the master allocated, the weights included, moves to the
+        # permanent generation, so collections in the workers never write to
+        # (and so copy) the pages they share with the master.
+        gc.collect()
+        gc.freeze()
+
+
+def pre_fork(server, worker):
+    # A replacement worker takes over the lowest slot, and so the cores, left free.
+    taken = {getattr(w, 'cpu_slot', None) for w in server.WORKERS.values()}
+    worker.cpu_slot = min(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    if cpu_plan.pin:
+        cores = cpu_plan.pin_worker(worker.cpu_slot)
+        server.log.info(f"Worker {worker.pid} pinned to CPUs {cores}")
+    if preload_app:
+        import app
+        app.start_background_threads()
+
+
+def child_exit(server, worker):
+    mark_process_dead(worker.pid)
@@ -0,0 +1,171 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prediction (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    image_hash VARCHAR(64) NOT NULL,
+    score REAL NOT NULL,
+    label VARCHAR(16) NOT NULL,
+    model_version VARCHAR(80) NOT NULL,
+    tier VARCHAR(16) NOT NULL,
+    tta_views INTEGER NOT NULL,
+    stage_ms TEXT NOT NULL,
+    user_id INTEGER REFERENCES user (id)
+);
+CREATE INDEX IF NOT EXISTS ix_prediction_image_hash ON prediction (image_hash);
+CREATE INDEX IF NOT EXISTS ix_prediction_created_at ON prediction (created_at);
+"""
+INSERT = """
+INSERT INTO prediction (created_at, image_hash, score, label, model_version, tier, tta_views, stage_ms, user_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def connect(db_path, schema=SCHEMA, timeout=30.0):
+    """A connection in WAL mode that waits up to ``timeout`` for another writer."""
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # In WAL mode NORMAL only syncs at checkpoints; a power cut can lose the
+    # last commits but never corrupts the database.
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(schema)
+    return conn
+
+
+class PredictionHistory:
+    """Records every prediction in the ``prediction`` table off the request path.
+
+    ``record`` puts a row on a bounded in-process queue and returns at once;
+    if the queue is full the row is dropped and counted rather than making the
+    request wait. One writer thread per worker collects rows for up to
+    ``linger`` seconds after the first one arrives, up to ``batch_size`` rows,
+    and inserts them in a single ``BEGIN IMMEDIATE`` transaction. The database
+    is in WAL mode, so readers never block the writers, and writers from other
+    gunicorn workers wait on SQLite's busy timeout for each other instead of
+    failing with "database is locked". A batch that still fails is retried
+    with backoff before it is dropped.
+    """
+
+    def __init__(self, db_path, max_queue=4096, batch_size=256, linger=0.05, max_retries=5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def record(self, image_hash, score, label, model_version, tier, tta_views, stage_seconds, user_id=None):
+        stage_ms = json.dumps({name: round(seconds * 1000, 2) for name, seconds in stage_seconds.items()}, separators=(',', ':'))
+        row = (time.time(), image_hash, score, label, model_version, tier, tta_views, stage_ms, user_id)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.recorded += 1
+        return True
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size and batch[-1] is not None:
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        stop = None in batch
+        return [row for row in batch if row is not None], stop
+
+    def _write(self, conn, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany(INSERT, batch)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                with self._lock:
+                    self.written += len(batch)
+                    self.batches += 1
+                return
+            except sqlite3.OperationalError as e:
+                logging.warning(f"Prediction history write of {len(batch)} rows failed (attempt {attempt + 1}): {e}")
+                time.sleep(min(0.1 * 2 ** attempt, 5.0))
+        with self._lock:
+            self.failed += len(batch)
+        logging.error(f"Dropped {len(batch)} prediction history rows after {self.max_retries + 1} attempts.")
+
+    def _run(self):
+        try:
+            conn = connect(self.db_path)
+        except sqlite3.Error:
+            logging.exception(f"Cannot open {self.db_path}; predictions will not be recorded.")
+            return
+        try:
+            while True:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._write(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def close(self, timeout=5.0):
+        """Flush the queued rows and stop the writer."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'queue_depth': self._queue.qsize(),
+                'recorded': self.recorded,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'mean_batch_rows': round(self.written / self.batches, 1) if self.batches else None,
+            }
+
+
+def history_from_env():
+    if os.environ.get('PREDICTION_HISTORY', '1') == '0':
+        return None
+    return PredictionHistory(
+        os.environ.get('PREDICTION_HISTORY_DB', 'instance/users.db'),
+        max_queue=int(os.environ.get('PREDICTION_HISTORY_MAX_QUEUE', 4096)),
+        batch_size=int(os.environ.get('PREDICTION_HISTORY_BATCH_SIZE', 256)),
+        linger=float(os.environ.get('PREDICTION_HISTORY_LINGER_SECONDS', 0.05)),
+    )
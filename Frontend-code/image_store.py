@@ -0,0 +1,201 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from PIL import Image
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+TEMP_PREFIX = '.tmp-'
+STALE_TEMP_SECONDS = 3600
+# Magic numbers of the formats /predict accepts.
+MIMETYPES = ((b'\x89PNG\r\n\x1a\n', 'image/png'), (b'\xff\xd8\xff', 'image/jpeg'))
+
+
+def sniff_mimetype(head):
+    for magic, mimetype in MIMETYPES:
+        if head.startswith(magic):
+            return mimetype
+    return 'application/octet-stream'
+
+
+def recompress_png(data):
+    """Re-encode a PNG with maximum deflate effort; the pixels are unchanged."""
+    with Image.open(io.BytesIO(data)) as img:
+        if img.format != 'PNG':
+            return data
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG', optimize=True)
+    smaller = buffer.getvalue()
+    return smaller if len(smaller) < len(data) else data
+
+
+class ImageStore:
+    """Uploaded images on disk, addressed by the SHA-256 of the uploaded bytes.
+
+    An image lives at ``<root>/ab/cd/abcd…`` after the first four hex digits
+    of its hash, so no directory grows past 65,536 entries. Files are written
+    to a temporary name in their shard and renamed into place, so readers in
+    any worker see either the whole image or none of it, and storing an image
+    that is already present only refreshes its timestamp. With ``recompress``
+    set, PNGs are re-encoded losslessly when that makes them smaller; the key
+    stays the hash of the upload.
+
+    Every store and read sets the file's mtime, and garbage collection deletes
+    the least recently used images once the store grows past ``max_bytes``,
+    down to ``low_water`` of it. Workers share the directory, so collection
+    scans it rather than trusting per-process counters; it runs on a
+    background thread after every ``max_bytes * (1 - low_water)`` bytes this
+    process has written.
+    """
+
+    def __init__(self, root, max_bytes, recompress=False, low_water=0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.recompress = recompress
+        self.low_water = low_water
+        self._written_since_gc = None  # None forces a collection after the first write
+        self._lock = threading.Lock()
+        self._gc_lock = threading.Lock()
+        self.stored = 0
+        self.deduplicated = 0
+        self.collected = 0
+        self.last_gc = None
+
+    def path(self, image_hash):
+        if not HASH_PATTERN.match(image_hash):
+            raise ValueError(f"Not a SHA-256 hex digest: {image_hash!r}")
+        return os.path.join(self.root, image_hash[:2], image_hash[2:4], image_hash)
+
+    def __contains__(self, image_hash):
+        return HASH_PATTERN.match(image_hash) is not None and os.path.exists(self.path(image_hash))
+
+    def put(self, data, image_hash=None):
+        """Store ``data`` unless it is already present and return its hash."""
+        image_hash = image_hash or hashlib.sha256(data).hexdigest()
+        path = self.path(image_hash)
+        if self._touch(path):
+            with self._lock:
+                self.deduplicated += 1
+            return image_hash
+        if self.recompress:
+            try:
+                data = recompress_png(data)
+            except Exception as e:
+                logging.warning(f"Storing {image_hash} as uploaded; recompression failed: {e}")
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self.stored += 1
+            written = self._written_since_gc
+            self._written_since_gc = (written or 0) + len(data)
+            due = written is None or self._written_since_gc >= self.max_bytes * (1 - self.low_water)
+        if due:
+            self.collect_in_background()
+        return image_hash
+
+    def touch(self, image_hash):
+        """Mark a stored image as recently used; False if it is not stored."""
+        return HASH_PATTERN.match(image_hash) is not None and self._touch(self.path(image_hash))
+
+    def open(self, image_hash):
+        """An open binary file for the image, or None if it is not stored."""
+        try:
+            path = self.path(image_hash)
+            f = open(path, 'rb')
+        except (ValueError, FileNotFoundError):
+            return None
+        self._touch(path)
+        return f
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _entries(self):
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # collected or renamed by another worker
+                if name.startswith(TEMP_PREFIX):
+                    if now - st.st_mtime > STALE_TEMP_SECONDS:
+                        self._remove(path)  # left behind by a crashed write
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def collect(self):
+        """Delete least recently used images until the store is under its low-water mark."""
+        with self._gc_lock:
+            start = time.perf_counter()
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = self.max_bytes * self.low_water
+            removed = 0
+            if total > self.max_bytes:
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    if self._remove(path):
+                        removed += 1
+                    total -= size
+            with self._lock:
+                self._written_since_gc = 0
+                self.collected += removed
+                self.last_gc = {'files': len(entries) - removed, 'bytes': total, 'removed': removed,
+                                'seconds': round(time.perf_counter() - start, 4), 'at': time.time()}
+            if removed:
+                logging.info(f"Image store: removed {removed} least recently used images, {total / 1e6:.1f} MB left.")
+            return self.last_gc
+
+    def collect_in_background(self):
+        if self._gc_lock.locked():
+            return
+        threading.Thread(target=self.collect, name='image-store-gc', daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'root': self.root,
+                'max_bytes': self.max_bytes,
+                'recompress': self.recompress,
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'collected': self.collected,
+                'last_gc': self.last_gc,
+            }
+
+
+def store_from_env():
+    return ImageStore(
+        os.environ.get('IMAGE_STORE_DIR', 'instance/images'),
+        max_bytes=int(float(os.environ.get('IMAGE_STORE_MAX_MB', 1024)) * 1024 * 1024),
+        recompress=os.environ.get('IMAGE_STORE_RECOMPRESS') == '1',
+    )
@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from history import connect
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    id VARCHAR(32) PRIMARY KEY,
+    image_hash VARCHAR(64) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker INTEGER,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_job_status_created_at ON job (status, created_at);
+"""
+COLUMNS = ('id', 'image_hash', 'status', 'created_at', 'started_at', 'finished_at', 'attempts', 'result', 'error')
+
+
+class JobQueue:
+    """A durable queue of scoring jobs in a SQLite table, shared by all workers.
+
+    A job names an image in the image store by its hash. ``claim`` moves the
+    oldest queued jobs to ``running`` in one ``BEGIN IMMEDIATE`` transaction,
+    so two workers never claim the same job. A claim is a lease: jobs left
+    ``running`` for longer than ``lease_seconds`` by a worker that died are
+    claimed again. A job that fails ``max_attempts`` times is marked
+    ``failed`` with the last error.
+    """
+
+    def __init__(self, db_path, max_queued=10000, lease_seconds=300.0, max_attempts=3):
+        self.db_path = db_path
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        # Wakes long-polls in this worker as soon as it finishes a job; jobs
+        # finished by other workers are seen on the next poll.
+        self._finished = threading.Condition()
+
+    @property
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path, SCHEMA)
+        return conn
+
+    def _transaction(self, statements):
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(conn)
+            conn.execute('COMMIT')
+            return result
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def queued(self):
+        return self._conn.execute('SELECT COUNT(*) FROM job WHERE status = ?', (QUEUED,)).fetchone()[0]
+
+    def enqueue(self, image_hashes):
+        """Queue one job per image and return the new job ids."""
+        now = time.time()
+        rows = [(uuid.uuid4().hex, image_hash, QUEUED, now) for image_hash in image_hashes]
+        self._transaction(lambda conn: conn.executemany(
+            'INSERT INTO job (id, image_hash, status, created_at) VALUES (?, ?, ?, ?)', rows))
+        return [row[0] for row in rows]
+
+    def claim(self, limit):
+        """Lease up to ``limit`` of the oldest runnable jobs as ``(id, image_hash, created_at)``."""
+        now = time.time()
+
+        def statements(conn):
+            # A job whose worker died on every attempt would crash each worker
+            # that claims it, so it is failed instead of leased again.
+            abandoned = conn.execute(
+                'UPDATE job SET status = ?, finished_at = ?, error = ? WHERE status = ? AND started_at < ? AND attempts >= ?',
+                (FAILED, now, f"The worker stopped while scoring this job {self.max_attempts} times.",
+                 RUNNING, now - self.lease_seconds, self.max_attempts)).rowcount
+            if abandoned:
+                logging.warning(f"Failed {abandoned} jobs abandoned by a worker {self.max_attempts} times.")
+            jobs = conn.execute(
+                'SELECT id, image_hash, created_at FROM job WHERE status = ? OR (status = ? AND started_at < ?) '
+                'ORDER BY created_at LIMIT ?', (QUEUED, RUNNING, now - self.lease_seconds, limit)).fetchall()
+            conn.executemany('UPDATE job SET status = ?, started_at = ?, worker = ?, attempts = attempts + 1 WHERE id = ?',
+                             [(RUNNING, now, os.getpid(), job_id) for job_id, _, _ in jobs])
+            return jobs
+        return self._transaction(statements)
+
+    def complete(self, results):
+        """Store ``{job_id: result}`` and mark those jobs done."""
+        now = time.time()
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE job SET status = ?, finished_at = ?, result = ?, error = NULL WHERE id = ?',
+            [(DONE, now, json.dumps(result), job_id) for job_id, result in results.items()]))
+        self._notify()
+
+    def fail(self, errors):
+        """Record ``{job_id: error}``; jobs with attempts left go back on the queue."""
+        now = time.time()
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE job SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+            'finished_at = CASE WHEN attempts >= ? THEN ? END, error = ? WHERE id = ?',
+            [(self.max_attempts, FAILED, QUEUED, self.max_attempts, now, error, job_id) for job_id, error in errors.items()]))
+        self._notify()
+
+    def release(self, job_ids):
+        """Put claimed jobs that were not started back on the queue, without using up an attempt."""
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE job SET status = ?, started_at = NULL, worker = NULL, attempts = attempts - 1 WHERE id = ? AND status = ?',
+            [(QUEUED, job_id, RUNNING) for job_id in job_ids]))
+
+    def purge(self, older_than):
+        """Delete jobs that finished more than ``older_than`` seconds ago."""
+        return self._transaction(lambda conn: conn.execute(
+            'DELETE FROM job WHERE status IN (?, ?) AND finished_at < ?', (*FINISHED, time.time() - older_than)).rowcount)
+
+    def _notify(self):
+        with self._finished:
+            self._finished.notify_all()
+
+    def get(self, job_id):
+        row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM job WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def wait(self, job_id, timeout, poll_interval=0.25):
+        """The job once it has finished or ``timeout`` seconds have passed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED or remaining <= 0:
+                return job
+            with self._finished:
+                self._finished.wait(min(poll_interval, remaining))
+
+    def snapshot(self):
+        counts = dict(self._conn.execute('SELECT status, COUNT(*) FROM job GROUP BY status').fetchall())
+        return {
+            'db_path': self.db_path,
+            'counts': {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            'max_queued': self.max_queued,
+            'lease_seconds': self.lease_seconds,
+            'max_attempts': self.max_attempts,
+        }
+
+
+class JobRunner:
+    """Scores queued jobs in batches on a background thread in each worker.
+
+    ``score_batch`` takes the claimed ``(id, image_hash, created_at)`` rows and
+    returns ``(results, errors)``, two dicts keyed by job id; an exception
+    fails the whole batch. Jobs in neither dict were not started and go back
+    on the queue. A batch is only claimed while ``idle()`` is true, so jobs
+    soak up spare capacity instead of competing with live requests.
+    """
+
+    def __init__(self, jobs, score_batch, idle=lambda: True, batch_size=8, poll_interval=0.5, retention_seconds=86400.0):
+        self.jobs = jobs
+        self.score_batch = score_batch
+        self.idle = idle
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.completed = 0
+        self.failed = 0
+        self.released = 0
+
+    def run_once(self):
+        """Claim and score one batch; returns the number of jobs claimed."""
+        if not self.idle():
+            return 0
+        batch = self.jobs.claim(self.batch_size)
+        if not batch:
+            return 0
+        try:
+            results, errors = self.score_batch(batch)
+        except Exception as e:
+            logging.exception(f"Scoring a batch of {len(batch)} jobs failed.")
+            results, errors = {}, {job_id: str(e) for job_id, _, _ in batch}
+        if results:
+            self.jobs.complete(results)
+        if errors:
+            self.jobs.fail(errors)
+        released = [job_id for job_id, _, _ in batch if job_id not in results and job_id not in errors]
+        if released:
+            self.jobs.release(released)
+        with self._lock:
+            self.batches += 1
+            self.completed += len(results)
+            self.failed += len(errors)
+            self.released += len(released)
+        return len(results) + len(errors)
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_purge > 3600:
+                    self.jobs.purge(self.retention_seconds)
+                    last_purge = time.monotonic()
+                if not self.run_once():
+                    time.sleep(self.poll_interval)
+            except Exception:
+                logging.exception("Job runner error.")
+                time.sleep(self.poll_interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='job-runner', daemon=True)
+        self._thread.start()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'batch_size': self.batch_size,
+                'batches': self.batches,
+                'completed': self.completed,
+                'failed': self.failed,
+                'released': self.released,
+            }
+
+
+def jobs_from_env():
+    return JobQueue(
+        os.environ.get('JOBS_DB', 'instance/jobs.db'),
+        max_queued=int(os.environ.get('JOBS_MAX_QUEUED', 10000)),
+        lease_seconds=float(os.environ.get('JOBS_LEASE_SECONDS', 300)),
+        max_attempts=int(os.environ.get('JOBS_MAX_ATTEMPTS', 3)),
+    )
@@ -0,0 +1,67 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# gunicorn workers are separate processes. With PROMETHEUS_MULTIPROC_DIR set
+# (run.sh does this) every worker writes its samples to memory-mapped files in
+# that directory, and /metrics aggregates all of them whichever worker serves it.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram('pneumonia_stage_seconds', 'Time spent in each stage of the serving path.', ['stage'], buckets=STAGE_BUCKETS)
+REQUESTS = Counter('pneumonia_requests_total', 'Requests received, by endpoint.', ['endpoint'])
+ERRORS = Counter('pneumonia_errors_total', 'Requests that failed or were rejected, by endpoint and reason.', ['endpoint', 'reason'])
+CACHE_LOOKUPS = Counter('pneumonia_cache_lookups_total', 'Cache lookups, by cache and result.', ['cache', 'result'])
+COLD_START_SECONDS = Histogram('pneumonia_cold_start_seconds', 'Cold-start time of a serving instance, by phase.', ['phase'], buckets=STAGE_BUCKETS)
+PREDICTIONS = Counter('pneumonia_predictions_total', 'Completed predictions, by label and serving tier.', ['label', 'tier'])
+
+# Per-request stage totals, collected only inside ``stage_timings()``.
+_stage_timings = ContextVar('stage_timings', default=None)
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def stage_timings():
+    """Collect the seconds spent in each stage run inside the block into a dict."""
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+def cache_lookup(cache_name, value):
+    CACHE_LOOKUPS.labels(cache_name, 'miss' if value is None else 'hit').inc()
+    return value
+
+
+def render():
+    """Return the Prometheus text exposition and its content type."""
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+FLAT_FORMAT = 'numpy-flat-weights'
+FLAT_ALIGNMENT = 64  # bytes; a cache line, and enough for any SIMD load
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def linear(x):
+    return x
+
+
+ACTIVATIONS = {'relu': relu, 'sigmoid': sigmoid, 'linear': linear}
+
+
+def conv2d(x, kernel, bias, strides=(1, 1), padding='valid'):
+    """NHWC convolution as one matmul per kernel offset.
+
+    Summing ``kh * kw`` shifted (N*H*W, C) @ (C, F) products keeps the
+    working set at the size of the output instead of materialising an
+    im2col matrix, and every product runs through BLAS.
+    """
+    kh, kw, _, filters = kernel.shape
+    sh, sw = strides
+    if padding == 'same':
+        pad_h = max((-(-x.shape[1] // sh) - 1) * sh + kh - x.shape[1], 0)
+        pad_w = max((-(-x.shape[2] // sw) - 1) * sw + kw - x.shape[2], 0)
+        x = np.pad(x, ((0, 0), (pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)))
+    n, h, w, _ = x.shape
+    out_h = (h - kh) // sh + 1
+    out_w = (w - kw) // sw + 1
+    out = np.empty((n, out_h, out_w, filters), dtype=np.float32)
+    out[...] = bias
+    for i in range(kh):
+        for j in range(kw):
+            window = x[:, i:i + (out_h - 1) * sh + 1:sh, j:j + (out_w - 1) * sw + 1:sw, :]
+            out += window @ kernel[i, j]
+    return out
+
+
+def max_pool2d(x, pool_size=(2, 2), strides=None, padding='valid'):
+    ph, pw = pool_size
+    sh, sw = strides or pool_size
+    if padding != 'valid':
+        raise ValueError(f"Unsupported pooling padding {padding!r}")
+    n, h, w, c = x.shape
+    out_h = (h - ph) // sh + 1
+    out_w = (w - pw) // sw + 1
+    if (ph, pw) == (sh, sw):
+        # Non-overlapping windows: a reshape and one reduction.
+        x = x[:, :out_h * ph, :out_w * pw, :]
+        return x.reshape(n, out_h, ph, out_w, pw, c).max(axis=(2, 4))
+    out = np.full((n, out_h, out_w, c), -np.inf, dtype=x.dtype)
+    for i in range(ph):
+        for j in range(pw):
+            np.maximum(out, x[:, i:i + (out_h - 1) * sh + 1:sh, j:j + (out_w - 1) * sw + 1:sw, :], out=out)
+    return out
+
+
+def layer_spec(kind, config, name):
+    """The NumpyModel spec for a Keras layer, or None for layers that are no-ops at inference."""
+    if kind == 'Conv2D':
+        if tuple(config.get('dilation_rate', (1, 1))) != (1, 1) or config.get('groups', 1) != 1:
+            raise ValueError(f"Unsupported Conv2D configuration in layer {name}")
+        spec = {'type': 'conv2d', 'strides': list(config['strides']), 'padding': config['padding'], 'activation': config['activation'],
+                'use_bias': config.get('use_bias', True)}
+    elif kind in ('MaxPooling2D', 'MaxPool2D'):
+        spec = {'type': 'max_pool2d', 'pool_size': list(config['pool_size']), 'strides': list(config['strides'] or config['pool_size']), 'padding': config['padding']}
+    elif kind == 'Flatten':
+        spec = {'type': 'flatten'}
+    elif kind == 'Dense':
+        spec = {'type': 'dense', 'activation': config['activation'], 'use_bias': config.get('use_bias', True)}
+    elif kind in ('Dropout', 'InputLayer'):
+        return None
+    else:
+        raise ValueError(f"Unsupported layer {kind} ({name})")
+    if spec.get('activation', 'linear') not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation {spec['activation']} in layer {name}")
+    return spec
+
+
+def check_weight_count(spec, count, name):
+    """Raise unless a layer has one tensor per weight its spec reads (a kernel, plus a bias if used)."""
+    expected = 1 + spec.get('use_bias', True) if spec['type'] in ('conv2d', 'dense') else 0
+    if count != expected:
+        raise ValueError(f"Layer {name} has {count} weight tensors, expected {expected}")
+
+
+class NumpyModel:
+    """A TensorFlow-free forward pass for the Sequential CNN served by this app.
+
+    ``layers`` is a list of dicts such as ``{'type': 'conv2d', 'strides': [1, 1],
+    'padding': 'valid', 'activation': 'relu'}`` and ``weights`` holds the
+    matching arrays in the same order as Keras' ``get_weights()``. ``predict``
+    mirrors ``keras.Model.predict`` closely enough to stand in for it.
+    """
+
+    def __init__(self, layers, weights, input_shape, source=None):
+        self.layers = layers
+        self.weights = weights
+        self.input_shape = (None,) + tuple(input_shape)
+        self.source = source  # the Keras file the weights came from, if known
+
+    @classmethod
+    def from_keras(cls, model):
+        layers, weights = [], []
+        for layer in model.layers:
+            spec = layer_spec(type(layer).__name__, layer.get_config(), layer.name)
+            if spec is None:
+                continue
+            spec['weights'] = len(layer.get_weights())
+            check_weight_count(spec, spec['weights'], layer.name)
+            layers.append(spec)
+            weights.extend(np.asarray(w, dtype=np.float32) for w in layer.get_weights())
+        return cls(layers, weights, model.input_shape[1:])
+
+    @classmethod
+    def from_h5(cls, path):
+        """Load a Keras ``.h5`` Sequential model without importing TensorFlow."""
+        import h5py
+        with h5py.File(path, 'r') as f:
+            config = json.loads(f.attrs['model_config'])
+            if config['class_name'] != 'Sequential':
+                raise ValueError(f"Unsupported model class {config['class_name']} in {path}")
+            group = f['model_weights'] if 'model_weights' in f else f
+            input_shape = config['config'].get('build_input_shape')
+            layers, weights = [], []
+            for layer in config['config']['layers']:
+                layer_config = layer['config']
+                input_shape = input_shape or layer_config.get('batch_shape') or layer_config.get('batch_input_shape')
+                spec = layer_spec(layer['class_name'], layer_config, layer_config['name'])
+                if spec is None:
+                    continue
+                names = [n.decode() if isinstance(n, bytes) else n for n in group[layer_config['name']].attrs['weight_names']] if layer_config['name'] in group else []
+                spec['weights'] = len(names)
+                check_weight_count(spec, spec['weights'], layer_config['name'])
+                layers.append(spec)
+                weights.extend(np.asarray(group[layer_config['name']][n], dtype=np.float32) for n in names)
+        if input_shape is None:
+            raise ValueError(f"No input shape recorded in {path}")
+        return cls(layers, weights, input_shape[1:], source=path)
+
+    @classmethod
+    def from_flat(cls, manifest_path):
+        """Memory-map a model written by ``save_flat``.
+
+        The weights stay read-only views into the mapped file, so loading costs
+        one ``mmap`` and the pages are shared through the page cache by every
+        process that serves the same file.
+        """
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FLAT_FORMAT or manifest.get('format_version') != 1:
+            raise ValueError(f"{manifest_path} is not a version 1 {FLAT_FORMAT} manifest")
+        weights_path = os.path.join(os.path.dirname(manifest_path), manifest['weights'])
+        buffer = np.memmap(weights_path, dtype=np.uint8, mode='r')
+        if buffer.size != manifest['size']:
+            raise ValueError(f"{weights_path} is {buffer.size} bytes, expected {manifest['size']}")
+        for i, spec in enumerate(manifest['layers']):
+            check_weight_count(spec, spec.get('weights', 0), f"{i} ({spec['type']})")
+        weights = [np.ndarray(tuple(t['shape']), dtype=manifest['dtype'], buffer=buffer, offset=t['offset']) for t in manifest['tensors']]
+        source = manifest.get('source')
+        if source is not None:
+            source = os.path.join(os.path.dirname(manifest_path), source)
+        return cls(manifest['layers'], weights, manifest['input_shape'], source=source)
+
+    def save_flat(self, manifest_path):
+        """Write the weights as one aligned float32 file next to a JSON manifest.
+
+        The weights file takes the manifest's name with a ``.bin`` suffix. Each
+        tensor starts on a ``FLAT_ALIGNMENT`` boundary. Both files are written
+        to temporary names and renamed, so a serving process never maps a
+        partial file.
+        """
+        weights_path = os.path.splitext(manifest_path)[0] + '.bin'
+        digest = hashlib.sha256()
+        tensors, offset = [], 0
+        with open(weights_path + '.tmp', 'wb') as f:
+            for w in self.weights:
+                padding = b'\0' * (-offset % FLAT_ALIGNMENT)
+                data = np.ascontiguousarray(w, dtype='<f4').tobytes()
+                for chunk in (padding, data):
+                    f.write(chunk)
+                    digest.update(chunk)
+                offset += len(padding)
+                tensors.append({'offset': offset, 'shape': list(w.shape)})
+                offset += len(data)
+        manifest = {
+            'format': FLAT_FORMAT,
+            'format_version': 1,
+            'dtype': '<f4',
+            'alignment': FLAT_ALIGNMENT,
+            'weights': os.path.basename(weights_path),
+            'size': offset,
+            'sha256': digest.hexdigest(),
+            'input_shape': list(self.input_shape[1:]),
+            'layers': self.layers,
+            'tensors': tensors,
+            # Relative to the manifest, so the pair can be moved together.
+            'source': os.path.relpath(self.source, os.path.dirname(os.path.abspath(manifest_path))) if self.source else None,
+        }
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(weights_path + '.tmp', weights_path)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        return manifest
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        weights = iter(self.weights)
+        for spec in self.layers:
+            kind = spec['type']
+            if kind == 'conv2d':
+                kernel = next(weights)
+                # Flat exports made before use_bias was recorded always have a bias.
+                bias = next(weights) if spec.get('use_bias', True) else 0.0
+                x = conv2d(x, kernel, bias, tuple(spec['strides']), spec['padding'])
+                x = ACTIVATIONS[spec['activation']](x)
+            elif kind == 'max_pool2d':
+                x = max_pool2d(x, tuple(spec['pool_size']), tuple(spec['strides']), spec['padding'])
+            elif kind == 'flatten':
+                x = x.reshape(x.shape[0], -1)
+            elif kind == 'dense':
+                x = x @ next(weights)
+                if spec.get('use_bias', True):
+                    x += next(weights)
+                x = ACTIVATIONS[spec['activation']](x)
+        return x
+
+    def predict(self, x, batch_size=32, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        batch_size = batch_size or 32
+        return np.concatenate([self(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+
+def load_model(path):
+    """Load a flat ``.json`` export by memory-mapping it, or a Keras ``.h5`` file."""
+    if path.endswith('.json'):
+        return NumpyModel.from_flat(path)
+    return NumpyModel.from_h5(path)
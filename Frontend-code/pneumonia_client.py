@@ -0,0 +1,336 @@
+"""Python client for the pneumonia detection server.
+
+    from pneumonia_client import Client
+
+    with Client('http://localhost:7860', resize=True) as client:
+        print(client.predict('xray.jpeg'))
+        for result in client.score_directory('chest_xray/test'):
+            print(result.source, result.label if result.ok else result.error)
+
+Images are decoded on the client and sent as raw pixels to
+``/predict/raw``, which answers in JSON. With ``resize=True`` the client first
+resizes each image to the served model's input size the way the server would,
+so uploads shrink to the pixels the model actually reads and the full model's
+score does not change. ``grayscale=True`` converts colour images instead of
+rejecting them. ``bits_stored`` gives the significant bits of 16-bit pixels,
+e.g. 12 for most X-ray detectors, so they are scaled like the server does. Requests go through one pooled session. A ``503`` from load
+shedding, or another transient failure, is retried with exponential backoff
+that honours ``Retry-After``. The module depends only on requests, Pillow
+and NumPy, so it can be copied into other projects.
+"""
+import collections
+import concurrent.futures
+import io
+import os
+import random
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import requests
+import urllib3
+from PIL import Image
+from requests.adapters import HTTPAdapter
+
+# The PXRW format read by /predict/raw (see raw_pixels.py on the server).
+RAW_HEADER = struct.Struct('<4sBBHII')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+RETRY_STATUSES = (429, 502, 503, 504)
+# A gateway error can come after the server acted on a request; these cannot.
+REFUSED_STATUSES = (429, 503)
+
+
+@dataclass(frozen=True)
+class Prediction:
+    source: Optional[str]
+    score: float
+    label: str
+    threshold: float
+    model_version: str
+    tier: str
+    image_hash: str
+    tta_views: int = 1
+    ok = True
+
+    @property
+    def positive(self):
+        return self.label == 'positive'
+
+
+@dataclass(frozen=True)
+class Failure:
+    source: Optional[str]
+    error: str
+    status: Optional[int] = None
+    ok = False
+
+
+class ServerError(Exception):
+    """The server rejected a request, or kept shedding it after every retry."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def pack_pixels(pixels, bits_stored=None):
+    """Encode a 2-D uint8 or uint16 array as a PXRW body."""
+    height, width = pixels.shape
+    return RAW_HEADER.pack(b'PXRW', 1, bits_stored or pixels.dtype.itemsize * 8, 0, height, width) + \
+        pixels.astype(pixels.dtype.newbyteorder('<'), copy=False).tobytes()
+
+
+def to_uint8(pixels, bits_stored=None):
+    """Rescale pixels with ``bits_stored`` significant bits to 0-255, as /predict/raw does."""
+    bits_stored = bits_stored or pixels.dtype.itemsize * 8
+    if pixels.dtype == np.uint8 and bits_stored == 8:
+        return pixels
+    scaled = pixels.astype(np.float32) * (255.0 / (2 ** bits_stored - 1))
+    return np.clip(np.rint(scaled), 0, 255).astype(np.uint8)
+
+
+def never_sent(error):
+    """True if a request failed while connecting, so the server never saw it."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+def iter_image_files(directory, recursive=True):
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+        if not recursive:
+            return
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Client:
+    """A thread-safe client that keeps up to ``workers`` pooled connections open."""
+
+    def __init__(self, base_url, workers=8, timeout=60.0, resize=False, grayscale=False, bits_stored=None,
+                 max_retries=6, backoff=0.5, max_backoff=30.0, poll_interval=1.0, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.timeout = timeout
+        self.resize = resize
+        self.grayscale = grayscale
+        self.bits_stored = bits_stored
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._target_size = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- HTTP ---
+    def _delay(self, attempt, retry_after):
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+        try:
+            return max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            return delay
+
+    def request(self, method, path, idempotent=None, **kwargs):
+        """Send a request, retrying connection errors and shed or throttled responses.
+
+        A request that is not ``idempotent`` (by default, anything but a GET)
+        is only sent again when the server cannot have acted on it: when the
+        connection could not be made, or on a ``429`` or ``503``.
+        """
+        if idempotent is None:
+            idempotent = method == 'GET'
+        retry_statuses = RETRY_STATUSES if idempotent else REFUSED_STATUSES
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries or not (idempotent or never_sent(e)):
+                    raise
+                retry_after = None
+            else:
+                if response.status_code not in retry_statuses or attempt == self.max_retries:
+                    return response
+                retry_after = response.headers.get('Retry-After')
+            time.sleep(self._delay(attempt, retry_after))
+
+    def _json(self, response):
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {'error': response.text[:200]}
+        if not response.ok:
+            raise ServerError(response.status_code, payload.get('error', response.reason))
+        return payload
+
+    # --- Images ---
+    def target_size(self):
+        """The served model's input size as ``(height, width)``."""
+        with self._lock:
+            if self._target_size is None:
+                height, width = self._json(self.request('GET', '/model'))['input_shape'][:2]
+                self._target_size = (height, width)
+            return self._target_size
+
+    def pixels(self, image):
+        """Decode a path, bytes, file, PIL image or array into the 2-D array that is uploaded."""
+        if isinstance(image, np.ndarray):
+            img = Image.fromarray(image)
+        elif isinstance(image, Image.Image):
+            img = image
+        elif isinstance(image, (bytes, bytearray)):
+            img = Image.open(io.BytesIO(image))
+        else:
+            img = Image.open(image)
+        if img.mode not in ('L', 'I;16'):
+            if not self.grayscale:
+                raise ValueError(f"Expected a grayscale X-ray, got a {img.mode} image; pass grayscale=True to convert it.")
+            img = img.convert('L')
+        if self.resize:
+            height, width = self.target_size()
+            if img.size != (width, height):
+                # The server resizes with nearest-neighbour too, so this picks the same pixels.
+                img = img.resize((width, height), Image.NEAREST)
+        return np.asarray(img)
+
+    @staticmethod
+    def _source(image):
+        return os.fspath(image) if isinstance(image, (str, os.PathLike)) else None
+
+    # --- Scoring ---
+    def predict(self, image):
+        """Score one image and return a :class:`Prediction`; raises :class:`ServerError`."""
+        pixels = self.pixels(image)
+        body = pack_pixels(pixels, self._bits_stored(pixels))
+        # Scoring the same pixels twice is harmless, so this POST is retried like a GET.
+        payload = self._json(self.request('POST', '/predict/raw', idempotent=True, data=body,
+                                          headers={'Content-Type': 'application/octet-stream'}))
+        return Prediction(self._source(image), payload['score'], payload['label'], payload['threshold'],
+                          payload['model_version'], payload['tier'], payload['image_hash'], payload['tta_views'])
+
+    def _predict_one(self, chunk):
+        image = chunk[0]
+        try:
+            return [self.predict(image)]
+        except ServerError as e:
+            return [Failure(self._source(image), e.message, e.status)]
+        except (OSError, ValueError, requests.RequestException) as e:
+            return [Failure(self._source(image), str(e))]
+
+    def _bits_stored(self, pixels):
+        # Only 16-bit pixels can have fewer significant bits than their dtype.
+        return self.bits_stored if pixels.dtype == np.uint16 else None
+
+    def _png(self, image):
+        pixels = self.pixels(image)
+        pixels = to_uint8(pixels, self._bits_stored(pixels))  # /jobs takes 8-bit images
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, 'L').save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+
+    def _predict_batch(self, chunk):
+        """Score a chunk through one POST /jobs and long-poll each job."""
+        results, files, sources = [None] * len(chunk), [], []
+        for i, image in enumerate(chunk):
+            try:
+                files.append(('imagefile', (f"{i}.png", self._png(image), 'image/png')))
+                sources.append((i, self._source(image)))
+            except (OSError, ValueError) as e:
+                results[i] = Failure(self._source(image), str(e))
+        if files:
+            try:
+                jobs = self._json(self.request('POST', '/jobs', files=files))['jobs']
+            except (ServerError, requests.RequestException) as e:
+                for i, source in sources:
+                    results[i] = Failure(source, getattr(e, 'message', str(e)), getattr(e, 'status', None))
+                return results
+            for (i, source), job in zip(sources, jobs):
+                results[i] = self._wait_for_job(job, source)
+        return results
+
+    def _wait_for_job(self, job, source):
+        # Short polls rather than ?wait= long-polls: a long-poll holds one of
+        # the server's request threads for its whole wait, and a batch run
+        # would otherwise pin one per client worker.
+        delay = self.poll_interval
+        while True:
+            try:
+                status = self._json(self.request('GET', f"/jobs/{job['id']}"))
+            except (ServerError, requests.RequestException) as e:
+                return Failure(source, getattr(e, 'message', str(e)), getattr(e, 'status', None))
+            if status['status'] == 'done':
+                result = status['result']
+                return Prediction(source, result['score'], result['label'], result['threshold'],
+                                  result['model_version'], 'full', status['image_hash'])
+            if status['status'] == 'failed':
+                return Failure(source, status['error'])
+            time.sleep(delay)
+            delay = min(delay * 1.5, self.poll_interval * 5)
+
+    def predict_many(self, images, batch_size=None, ordered=True):
+        """Score an iterable of images concurrently, yielding a result per image.
+
+        Each result is a :class:`Prediction` or, for an image that could not be
+        scored, a :class:`Failure`. Without ``batch_size`` every image is its
+        own ``/predict/raw`` request; with it, images are uploaded
+        ``batch_size`` at a time through the job queue and polled every
+        ``poll_interval`` seconds or so until they finish. At most ``2 * workers``
+        requests are in flight, so ``images`` can be a generator over any
+        number of files. With ``ordered=False`` results come back as they
+        finish.
+        """
+        score = self._predict_batch if batch_size else self._predict_one
+        window = self.workers * 2
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+            pending = collections.deque()
+            for chunk in chunked(images, batch_size or 1):
+                pending.append(pool.submit(score, chunk))
+                while len(pending) >= window:
+                    yield from self._next_done(pending, ordered)
+            while pending:
+                yield from self._next_done(pending, ordered)
+
+    @staticmethod
+    def _next_done(pending, ordered):
+        if ordered:
+            return pending.popleft().result()
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        results = []
+        for future in done:
+            pending.remove(future)
+            results.extend(future.result())
+        return results
+
+    def score_directory(self, directory, recursive=True, batch_size=None, ordered=False):
+        """Stream results for every PNG or JPEG under ``directory``."""
+        return self.predict_many(iter_image_files(directory, recursive), batch_size=batch_size, ordered=ordered)
@@ -0,0 +1,38 @@
+from PIL import Image
+import numpy as np
+
+
+def to_grayscale(img):
+    if img.mode not in ('L', 'I;16', 'I'):
+        img = img.convert('L')
+    return img
+
+
+def resize_pixels(img, target_size):
+    """The grayscale pixels of ``img`` at ``target_size`` as an (H, W) array, not yet scaled."""
+    height, width = target_size
+    img = to_grayscale(img)
+    if img.size != (width, height):
+        img = img.resize((width, height), Image.NEAREST)
+    return np.asarray(img)
+
+
+def normalize(pixels):
+    """Scale (H, W) pixels into a (1, H, W, 1) float32 batch."""
+    x = np.asarray(pixels, dtype=np.float32) / 255.0
+    return x[np.newaxis, :, :, np.newaxis]
+
+
+def to_tensor(img, target_size):
+    """Resize a decoded grayscale image and scale it into a (1, H, W, 1) batch.
+
+    Matches ``load_img(..., color_mode='grayscale')`` followed by
+    ``img_to_array`` and ``/ 255.0``, so one decoded image can be fed to
+    models with different input sizes without decoding it again.
+    """
+    return normalize(resize_pixels(img, target_size))
+
+
+def load_tensor(path, target_size):
+    with Image.open(path) as img:
+        return to_tensor(img, target_size)
@@ -0,0 +1,105 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from html import escape
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class StackSampler:
+    """Samples the Python stacks of every other thread in this process.
+
+    The thread calling ``run`` wakes up every ``interval`` seconds, walks
+    ``sys._current_frames()`` and counts each stack in collapsed form
+    (``thread;outer;inner;leaf``). Nothing runs between profiles, so the
+    profiler costs nothing while it is not being used.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def _sample(self, own_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join([names.get(ident, str(ident))] + labels[::-1])] += 1
+        self.samples += 1
+
+    def run(self, duration):
+        own_ident = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            self._sample(own_ident)
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def flame_graph_svg(stacks, width=1200, row_height=16, title='Flame graph'):
+    """Render collapsed stacks as a self-contained flame graph SVG."""
+    root = {'count': 0, 'children': {}}
+    for stack, count in stacks.items():
+        node = root
+        node['count'] += count
+        for label in stack.split(';'):
+            node = node['children'].setdefault(label, {'count': 0, 'children': {}})
+            node['count'] += count
+
+    rects = []
+    depth_max = 0
+
+    def layout(node, x, depth):
+        nonlocal depth_max
+        depth_max = max(depth_max, depth)
+        for label, child in sorted(node['children'].items()):
+            w = child['count'] / root['count'] * width if root['count'] else 0
+            if w >= 0.5:
+                rects.append((x, depth, w, label, child['count']))
+                layout(child, x, depth + 1)
+            x += w
+
+    layout(root, 0.0, 0)
+    height = (depth_max + 2) * row_height
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" font-family="monospace" font-size="11">',
+        f'<text x="4" y="{row_height - 4}">{escape(title)} ({root["count"]} samples)</text>',
+    ]
+    for x, depth, w, label, count in rects:
+        y = height - (depth + 1) * row_height
+        hue = 10 + zlib.crc32(label.encode()) % 40
+        text = escape(label[: int(w / 7)]) if w > 21 else ''
+        parts.append(
+            f'<g><title>{escape(label)} ({count} samples, {count / root["count"]:.1%})</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" fill="hsl({hue},85%,60%)"/>'
+            f'<text x="{x + 2:.1f}" y="{y + row_height - 4}">{text}</text></g>'
+        )
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def tracemalloc_report(snapshot, limit=15):
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    lines = []
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}")
+    return '\n'.join(lines)
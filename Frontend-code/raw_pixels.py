@@ -0,0 +1,95 @@
+import io
+import struct
+
+import numpy as np
+
+NPY_MAGIC = b'\x93NUMPY'
+RAW_MAGIC = b'PXRW'
+# magic, format version, bits stored per pixel, reserved, height, width; the
+# pixels follow row by row as uint8 (bits <= 8) or little-endian uint16.
+RAW_HEADER = struct.Struct('<4sBBHII')
+RAW_VERSION = 1
+NPY_HEADER_ALLOWANCE = 4096
+
+
+class InvalidPixels(ValueError):
+    """Raised when a raw pixel upload cannot be scored."""
+
+
+def pack(pixels, bits_stored=None):
+    """Encode a 2-D uint8 or uint16 array in the compact raw format."""
+    pixels = np.asarray(pixels)
+    bits_stored = bits_stored or pixels.dtype.itemsize * 8
+    height, width = pixels.shape
+    return RAW_HEADER.pack(RAW_MAGIC, RAW_VERSION, bits_stored, 0, height, width) + pixels.astype(pixels.dtype.newbyteorder('<')).tobytes()
+
+
+def max_body_bytes(max_side):
+    return RAW_HEADER.size + NPY_HEADER_ALLOWANCE + max_side * max_side * 2
+
+
+def check_shape(shape, min_side, max_side):
+    if len(shape) == 3 and shape[2] == 1:
+        shape = shape[:2]
+    if len(shape) != 2:
+        raise InvalidPixels(f"Expected a 2-D grayscale array, got shape {tuple(shape)}.")
+    if not all(min_side <= side <= max_side for side in shape):
+        raise InvalidPixels(f"Each side must be between {min_side} and {max_side} pixels, got {shape[0]}x{shape[1]}.")
+    return shape
+
+
+def parse(body, bits_stored=None, min_side=64, max_side=4096):
+    """Decode a ``.npy`` or compact raw upload into ``(pixels, bits_stored)``.
+
+    ``pixels`` is a 2-D uint8 or uint16 array. ``bits_stored`` comes from the
+    raw header; for ``.npy`` uploads it is the argument, or the dtype's size.
+    """
+    if body.startswith(NPY_MAGIC):
+        # Check the header before touching the data, so a small body cannot
+        # declare a huge array.
+        f = io.BytesIO(body)
+        try:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            else:
+                raise InvalidPixels(f"Unsupported .npy format version {version[0]}.{version[1]}.")
+        except ValueError as e:
+            raise InvalidPixels(f"Unreadable .npy header: {e}")
+        if dtype.kind != 'u' or dtype.itemsize not in (1, 2):
+            raise InvalidPixels(f"Expected uint8 or uint16 pixels, got {dtype}.")
+        height, width = check_shape(shape, min_side, max_side)
+        expected = f.tell() + height * width * dtype.itemsize
+        if len(body) != expected:
+            raise InvalidPixels(f"Expected {expected} bytes for a {height}x{width} {dtype.name} .npy array, got {len(body)}.")
+        pixels = np.frombuffer(body, dtype, offset=f.tell()).reshape((height, width), order='F' if fortran_order else 'C')
+        bits_stored = bits_stored or dtype.itemsize * 8
+    elif body.startswith(RAW_MAGIC):
+        if len(body) < RAW_HEADER.size:
+            raise InvalidPixels('Truncated raw header.')
+        _, version, bits_stored, _, height, width = RAW_HEADER.unpack_from(body)
+        if version != RAW_VERSION:
+            raise InvalidPixels(f"Unsupported raw format version {version}.")
+        if not 1 <= bits_stored <= 16:
+            raise InvalidPixels(f"Bits stored must be between 1 and 16, got {bits_stored}.")
+        check_shape((height, width), min_side, max_side)
+        dtype = np.dtype(np.uint8) if bits_stored <= 8 else np.dtype('<u2')
+        expected = RAW_HEADER.size + height * width * dtype.itemsize
+        if len(body) != expected:
+            raise InvalidPixels(f"Expected {expected} bytes for {height}x{width} {dtype.name} pixels, got {len(body)}.")
+        pixels = np.frombuffer(body, dtype, offset=RAW_HEADER.size).reshape(height, width)
+    else:
+        raise InvalidPixels('Send a .npy array or a PXRW raw header followed by the pixels.')
+    if not 1 <= bits_stored <= pixels.dtype.itemsize * 8:
+        raise InvalidPixels(f"Bits stored must be between 1 and {pixels.dtype.itemsize * 8} for {pixels.dtype}, got {bits_stored}.")
+    return pixels, bits_stored
+
+
+def to_uint8(pixels, bits_stored):
+    """Rescale pixels with ``bits_stored`` significant bits to the 0-255 range of 8-bit uploads."""
+    if pixels.dtype == np.uint8 and bits_stored == 8:
+        return pixels
+    scaled = pixels.astype(np.float32) * (255.0 / (2 ** bits_stored - 1))
+    return np.clip(np.rint(scaled), 0, 255).astype(np.uint8)
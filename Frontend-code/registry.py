@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from tiers import FULL, Tier
+
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_PREPROCESSING = {'color_mode': 'grayscale', 'interpolation': 'nearest', 'rescale': 1 / 255.0}
+DEFAULT_INPUT_SHAPE = (500, 500, 1)
+DEFAULT_THRESHOLD = 0.5
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelVersion:
+    """An immutable, warmed-up model version as handed to a request."""
+
+    def __init__(self, version, tier, threshold, manifest, warmup_seconds, path):
+        self.version = version
+        self.tier = tier
+        self.threshold = threshold
+        self.manifest = manifest
+        self.warmup_seconds = warmup_seconds
+        self.path = path
+
+
+class ModelRegistry:
+    """Serves the active version from a directory of versioned model artifacts.
+
+    ``manifest.json`` in the registry directory names the active artifact::
+
+        {"version": "2024-06-01", "path": "2024-06-01/pneu_cnn_model.h5",
+         "input_shape": [500, 500, 1], "threshold": 0.5, "sha256": "...",
+         "preprocessing": {"color_mode": "grayscale", "interpolation": "nearest",
+                           "rescale": 0.00392156862745098}}
+
+    A background thread polls the manifest. When it changes, the new version is
+    verified, loaded and warmed up off the request path and then swapped in
+    with a single reference assignment. Requests take ``registry.current`` once
+    and keep using that version, so in-flight requests finish on the old
+    version. Without a manifest the registry serves ``fallback_path``.
+    ``on_swap`` is called with each version after it is swapped in.
+    """
+
+    def __init__(self, directory, fallback_path, loader, poll_interval=5.0, warmup=True, on_swap=None):
+        self.directory = directory
+        self.fallback_path = fallback_path
+        self.loader = loader
+        self.poll_interval = poll_interval
+        self.warmup = warmup
+        self.on_swap = on_swap
+        self._manifest_bytes = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.swaps = 0
+        self.failures = 0
+        self.current = self._load(self._read_manifest())
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        self._manifest_bytes = raw
+        return json.loads(raw)
+
+    def _load(self, manifest):
+        if manifest is None:
+            sha256 = file_sha256(self.fallback_path)
+            manifest = {
+                'version': f"legacy-{sha256[:12]}",
+                'path': self.fallback_path,
+                'input_shape': list(DEFAULT_INPUT_SHAPE),
+                'threshold': DEFAULT_THRESHOLD,
+                'sha256': sha256,
+                'preprocessing': DEFAULT_PREPROCESSING,
+            }
+            path = self.fallback_path
+        else:
+            path = os.path.join(self.directory, manifest['path'])
+            expected = manifest.get('sha256')
+            if expected and file_sha256(path) != expected:
+                raise ValueError(f"Checksum mismatch for {path}")
+
+        preprocessing = {**DEFAULT_PREPROCESSING, **manifest.get('preprocessing', {})}
+        if preprocessing != DEFAULT_PREPROCESSING:
+            raise ValueError(f"Unsupported preprocessing spec {preprocessing}")
+        input_shape = tuple(manifest.get('input_shape', DEFAULT_INPUT_SHAPE))
+        if len(input_shape) != 3 or input_shape[2] != 1:
+            raise ValueError(f"Unsupported input shape {input_shape}")
+
+        model = self.loader(path)
+        start = time.perf_counter()
+        if self.warmup:
+            model.predict(np.zeros((1,) + input_shape, dtype=np.float32), verbose=0)
+        warmup_seconds = time.perf_counter() - start
+
+        version = str(manifest['version'])
+        logging.info(f"Loaded model version {version} from {path} (warm-up {warmup_seconds:.2f}s).")
+        return ModelVersion(version, Tier(FULL, model, input_shape[:2]), float(manifest.get('threshold', DEFAULT_THRESHOLD)), manifest, warmup_seconds, path)
+
+    def check(self):
+        """Load and swap in the manifest's version if the manifest changed."""
+        with self._lock:
+            previous = self._manifest_bytes
+            try:
+                manifest = self._read_manifest()
+                if manifest is None or self._manifest_bytes == previous:
+                    return False
+                if str(manifest.get('version')) == self.current.version:
+                    return False
+                loaded = self._load(manifest)
+            except Exception as e:
+                # Forget the failed manifest so the next poll tries it again,
+                # e.g. once an artifact that was still being copied is complete.
+                self._manifest_bytes = previous
+                self.failures += 1
+                logging.error(f"Failed to load model from {self.manifest_path}; keeping version {self.current.version}: {e}")
+                return False
+            old, self.current = self.current, loaded
+            self.swaps += 1
+            logging.info(f"Swapped model version {old.version} -> {loaded.version}.")
+            if self.on_swap is not None:
+                try:
+                    self.on_swap(loaded)
+                except Exception:
+                    logging.exception(f"Swap callback failed for version {loaded.version}.")
+            return True
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.check()
+
+    def start(self):
+        if self.poll_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+        self._thread.start()
+
+    def snapshot(self):
+        current = self.current
+        return {
+            'version': current.version,
+            'threshold': current.threshold,
+            'input_shape': list(current.tier.target_size) + [1],
+            'sha256': current.manifest.get('sha256'),
+            'warmup_seconds': round(current.warmup_seconds, 4),
+            'swaps': self.swaps,
+            'failures': self.failures,
+        }
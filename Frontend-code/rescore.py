@@ -0,0 +1,196 @@
+"""Re-score stored predictions with the promoted model and record changed diagnoses.
+
+Walks the ``prediction`` table in id order with keyset pagination, loads each
+image from the image store and scores it with the version the model registry
+now serves. Predictions whose label changes are written to the
+``rescore_diff`` table. Each batch's diff rows and the run's position are
+committed together, so an interrupted run continues where it stopped when it
+is started again for the same version.
+
+The job runs at low CPU priority with few threads and sleeps between batches
+to keep its duty cycle under ``--max-duty``. With ``--live-url`` it also
+pauses while the server reports requests waiting for an inference slot.
+
+    python rescore.py
+    python rescore.py --batch-size 256 --max-duty 0.25 --live-url http://localhost:7860 --csv changed.csv
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+import urllib.request
+
+from cpu_plan import THREAD_ENV
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rescore_run (
+    id INTEGER PRIMARY KEY,
+    model_version VARCHAR(80) NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    last_prediction_id INTEGER NOT NULL DEFAULT 0,
+    scanned INTEGER NOT NULL DEFAULT 0,
+    missing INTEGER NOT NULL DEFAULT 0,
+    changed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rescore_diff (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES rescore_run (id),
+    prediction_id INTEGER NOT NULL REFERENCES prediction (id),
+    image_hash VARCHAR(64) NOT NULL,
+    old_version VARCHAR(80) NOT NULL,
+    old_score REAL NOT NULL,
+    old_label VARCHAR(16) NOT NULL,
+    new_score REAL NOT NULL,
+    new_label VARCHAR(16) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_rescore_diff_run_id ON rescore_diff (run_id);
+"""
+DIFF_COLUMNS = ('prediction_id', 'image_hash', 'old_version', 'old_score', 'old_label', 'new_score', 'new_label')
+
+
+def open_run(conn, model_version, restart):
+    """Resume the unfinished run for ``model_version``, or start a new one.
+
+    A new run starts after the predictions the last finished run covered.
+    """
+    start_after = 0
+    if not restart:
+        row = conn.execute('SELECT id, last_prediction_id, scanned, missing, changed, finished_at FROM rescore_run '
+                           'WHERE model_version = ? ORDER BY id DESC LIMIT 1', (model_version,)).fetchone()
+        if row is not None and row[5] is None:
+            return row[:5]
+        if row is not None:
+            start_after = row[1]
+    now = time.time()
+    run_id = conn.execute('INSERT INTO rescore_run (model_version, started_at, updated_at, last_prediction_id) VALUES (?, ?, ?, ?)',
+                          (model_version, now, now, start_after)).lastrowid
+    return run_id, start_after, 0, 0, 0
+
+
+def next_page(conn, after_id, model_version, limit):
+    # Keyset pagination: the primary-key index finds the start of every page
+    # directly, however far into the table the run is.
+    return conn.execute(
+        'SELECT id, image_hash, model_version, score, label FROM prediction '
+        'WHERE id > ? AND model_version != ? ORDER BY id LIMIT ?', (after_id, model_version, limit)).fetchall()
+
+
+def live_queue_depth(live_url):
+    try:
+        with urllib.request.urlopen(live_url.rstrip('/') + '/queue', timeout=2) as response:
+            return json.load(response)['queue_depth']
+    except (OSError, ValueError, KeyError):
+        return 0  # an unreachable server has no live traffic to protect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=os.environ.get('PREDICTION_HISTORY_DB', 'instance/users.db'))
+    parser.add_argument('--batch-size', type=int, default=128, help='Predictions fetched and scored per batch.')
+    parser.add_argument('--max-duty', type=float, default=0.5, help='Largest fraction of wall time spent scoring.')
+    parser.add_argument('--threads', type=int, default=1, help='Compute threads for inference.')
+    parser.add_argument('--live-url', help='Pause while this server has requests queued for inference.')
+    parser.add_argument('--backend', choices=('keras', 'numpy'), default=os.environ.get('SERVING_BACKEND', 'keras'))
+    parser.add_argument('--restart', action='store_true', help='Start a new run instead of resuming.')
+    parser.add_argument('--csv', help='Also export the changed classifications of the run to this file.')
+    args = parser.parse_args()
+    if not 0 < args.max_duty <= 1:
+        parser.error('--max-duty must be in (0, 1]')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    # Thread pools read these when the model runtime starts.
+    for name in THREAD_ENV:
+        os.environ[name] = str(args.threads)
+    os.environ['TF_NUM_INTEROP_THREADS'] = '1'
+    os.nice(10)
+
+    from bulk_score import load_serving_version
+    from cache import LRUCache
+    from history import connect
+    from image_store import store_from_env
+    from preprocessing import load_tensor
+    import numpy as np
+
+    current = load_serving_version(args.backend)
+    image_store = store_from_env()
+    conn = connect(args.db)
+    conn.executescript(SCHEMA)
+    run_id, last_id, scanned, missing, changed = open_run(conn, current.version, args.restart)
+    logging.info(f"Run {run_id}: re-scoring predictions not made by {current.version}, from prediction id {last_id}.")
+    scores = LRUCache(4096)  # repeat uploads of an image are scored once
+
+    while True:
+        if args.live_url:
+            while live_queue_depth(args.live_url) > 0:
+                time.sleep(1.0)
+        page = next_page(conn, last_id, current.version, args.batch_size)
+        if not page:
+            break
+        start = time.perf_counter()
+        pending = {}
+        for _, image_hash, _, _, _ in page:
+            if image_hash in pending or scores.get(image_hash) is not None:
+                continue
+            f = image_store.open(image_hash)
+            if f is None:
+                continue
+            with f:
+                try:
+                    pending[image_hash] = load_tensor(f, current.tier.target_size)
+                except OSError as e:
+                    logging.warning(f"Skipping unreadable stored image {image_hash}: {e}")
+        if pending:
+            batch = current.tier.model.predict(np.concatenate(list(pending.values())), batch_size=len(pending), verbose=0)[:, 0]
+            for image_hash, score in zip(pending, batch.tolist()):
+                scores.put(image_hash, score)
+
+        diffs = []
+        for prediction_id, image_hash, old_version, old_score, old_label in page:
+            score = scores.get(image_hash)
+            if score is None:
+                missing += 1
+                continue
+            label = 'positive' if score >= current.threshold else 'negative'
+            if label != old_label:
+                diffs.append((run_id, prediction_id, image_hash, old_version, old_score, old_label, score, label))
+        scanned += len(page)
+        changed += len(diffs)
+        last_id = page[-1][0]
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany(f"INSERT INTO rescore_diff (run_id, {', '.join(DIFF_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", diffs)
+        conn.execute('UPDATE rescore_run SET last_prediction_id = ?, scanned = ?, missing = ?, changed = ?, updated_at = ? WHERE id = ?',
+                     (last_id, scanned, missing, changed, time.time(), run_id))
+        conn.execute('COMMIT')
+
+        busy = time.perf_counter() - start
+        logging.info(f"Through prediction {last_id}: {scanned} scanned, {changed} changed, {missing} without a readable stored image.")
+        time.sleep(busy * (1 - args.max_duty) / args.max_duty)
+
+    conn.execute('UPDATE rescore_run SET finished_at = ?, updated_at = ? WHERE id = ?', (time.time(), time.time(), run_id))
+    rows = conn.execute(f"SELECT {', '.join(DIFF_COLUMNS)} FROM rescore_diff WHERE run_id = ? ORDER BY prediction_id", (run_id,)).fetchall()
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(DIFF_COLUMNS)
+            writer.writerows(rows)
+    flips = {}
+    for row in rows:
+        flips[(row[4], row[6])] = flips.get((row[4], row[6]), 0) + 1
+    print(f"Run {run_id} with {current.version}: {scanned} predictions scanned, {missing} without a stored image, {changed} changed.")
+    for (old_label, new_label), count in sorted(flips.items()):
+        print(f"  {old_label} -> {new_label}: {count}")
+    if rows:
+        print(f"{'prediction':>10}  {'old version':<24}  {'old':>6}  {'new':>6}  change")
+        for prediction_id, _, old_version, old_score, old_label, new_score, new_label in rows[:20]:
+            print(f"{prediction_id:>10}  {old_version:<24}  {old_score:>6.3f}  {new_score:>6.3f}  {old_label} -> {new_label}")
+        if len(rows) > 20:
+            print(f"  ... {len(rows) - 20} more in rescore_diff (run_id = {run_id})")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,14 @@
 # Exit immediately if a command exits with a non-zero status.
 set -e
 
-
+# Workers write their Prometheus samples here so /metrics can aggregate them.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
 
 # Start the Gunicorn server
+# The worker count and per-worker thread pools come from the CPU plan in
+# gunicorn.conf.py (see cpu_plan.py); set GUNICORN_WORKERS to override it.
+# gunicorn.conf.py also sizes each worker's threads and connections so that
+# every request waiting for inference does so inside admission control, which
+# can shed it; a short backlog keeps the kernel queue bounded too.
 echo "Starting Gunicorn server..."
-exec gunicorn -w 4 -b 0.0.0.0:7860 app:app
+exec gunicorn -c gunicorn.conf.py -b "0.0.0.0:${PORT:-7860}" app:app
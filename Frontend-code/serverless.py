@@ -0,0 +1,142 @@
+"""TensorFlow-free entry point for serverless deployments (see vercel.json).
+
+Serves the index page and /predict like app.py, but scores with the NumPy
+forward pass from a memory-mapped flat export (see export_weights.py), so the
+bundle needs no TensorFlow and a cold start costs an import and an ``mmap``.
+The model is loaded on the first request that needs it and kept in module
+globals for warm invocations. Load shedding, tiers, the cascade, TTA, Grad-CAM
+and shadow scoring are left to the full server.
+"""
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+
+from PIL import Image
+from flask import Flask, Response, render_template, request, make_response
+
+from advice import ADVICE_THRESHOLD, CARE_INSIGHTS, PREVENTION_INSIGHTS, nearby_facilities
+from metrics import COLD_START_SECONDS, ERRORS, PREDICTIONS, REQUESTS, stage, render as render_metrics
+from numpy_backend import load_model
+from preprocessing import to_tensor
+from registry import ModelRegistry
+from tiers import FULL
+
+app = Flask(__name__)
+logging.basicConfig(level=logging.INFO)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+MODEL_PATH = os.environ.get('MODEL_PATH', 'models/pneu_cnn_model.flat.json')
+
+# --- Cold Start ---
+# Each cold-start phase is reported once per instance, when it happens: in the
+# pneumonia_cold_start_seconds histogram, as one JSON log line, and in the
+# X-Cold-Start and Server-Timing headers of the response that paid for it.
+unreported_phases = {}
+cold_start_lock = threading.Lock()
+registry = None
+registry_lock = threading.Lock()
+
+
+def record_cold_start(phase, seconds):
+    COLD_START_SECONDS.labels(phase).observe(seconds)
+    with cold_start_lock:
+        unreported_phases[phase] = seconds
+
+
+def current_version():
+    global registry
+    if registry is None:
+        with registry_lock:
+            if registry is None:
+                start = time.perf_counter()
+                loaded = ModelRegistry(os.environ.get('MODEL_REGISTRY_DIR', 'models/registry'), MODEL_PATH, load_model, poll_interval=0, warmup=False)
+                record_cold_start('model_load', time.perf_counter() - start)
+                registry = loaded
+    return registry.current
+
+
+record_cold_start('import', time.perf_counter() - IMPORT_STARTED)
+
+
+@app.after_request
+def report_cold_start(response):
+    with cold_start_lock:
+        phases = dict(unreported_phases)
+        unreported_phases.clear()
+    response.headers['X-Cold-Start'] = '1' if phases else '0'
+    if phases:
+        logging.info(json.dumps({'event': 'cold_start', **{f"{phase}_seconds": round(seconds, 4) for phase, seconds in phases.items()}}))
+        response.headers['Server-Timing'] = ', '.join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in phases.items())
+    return response
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+
+@app.route('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    REQUESTS.labels('predict').inc()
+    imagefile = request.files.get('imagefile')
+    if imagefile is None or imagefile.filename == '' or not allowed_file(imagefile.filename):
+        ERRORS.labels('predict', 'invalid').inc()
+        return render_template('index.html', error='Please upload a valid image file.')
+    try:
+        with stage('upload_read'):
+            image_bytes = imagefile.read()
+        img = Image.open(io.BytesIO(image_bytes))
+        if img.mode != 'L':
+            ERRORS.labels('predict', 'not_grayscale').inc()
+            return render_template('index.html', error='Warning: This does not appear to be a grayscale X-ray image. Please upload a valid X-ray.')
+        with stage('decode'):
+            img.load()
+
+        current = current_version()
+        with stage('resize'):
+            x = to_tensor(img, current.tier.target_size)
+        with stage('inference'):
+            prediction = float(current.tier.model.predict(x)[0][0])
+        positive = prediction >= current.threshold
+        classification = f"{'Positive' if positive else 'Negative'} ({prediction * 100:.2f}%)"
+        PREDICTIONS.labels('positive' if positive else 'negative', FULL).inc()
+
+        with stage('preview'):
+            image_data_url = f"data:image/jpeg;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+        hospitals = {}
+        if prediction >= ADVICE_THRESHOLD:
+            insights = CARE_INSIGHTS
+            user_lat = request.form.get('latitude')
+            user_lon = request.form.get('longitude')
+            if user_lat and user_lon:
+                hospitals = nearby_facilities(float(user_lat), float(user_lon))
+        else:
+            insights = PREVENTION_INSIGHTS
+
+        with stage('render'):
+            response = make_response(render_template('index.html', prediction=classification, imagePath=image_data_url, insights=insights, hospitals=hospitals, tier=FULL, model_version=current.version))
+        response.headers['X-Model-Version'] = current.version
+        response.headers['X-Image-Hash'] = hashlib.sha256(image_bytes).hexdigest()
+        return response
+    except Exception as e:
+        logging.error(f"Error processing image: {e}")
+        ERRORS.labels('predict', 'exception').inc()
+        return render_template('index.html', error='Invalid image file or error processing image.')
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+
+class ShadowScorer:
+    """Scores a sample of live traffic with a candidate model off the hot path.
+
+    ``submit`` never blocks: a request is sampled with probability
+    ``sample_rate`` and its preprocessed tensor is put on a bounded queue, or
+    dropped if the queue is full. A single low-priority background thread
+    scores queued tensors with the candidate and appends one compact JSON line
+    per sample to ``log_path`` with both scores, their delta, whether the
+    decision flipped at the live version's threshold and both latencies.
+    """
+
+    def __init__(self, candidate, log_path, sample_rate=0.1, max_queue=16):
+        self.candidate = candidate
+        self.log_path = log_path
+        self.sample_rate = sample_rate
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.submitted = 0
+        self.dropped = 0
+        self.skipped = 0
+        self.scored = 0
+        self.disagreements = 0
+        self._abs_delta_sum = 0.0
+        self._live_seconds_sum = 0.0
+        self._shadow_seconds_sum = 0.0
+
+    def submit(self, x, live_score, live_seconds, image_hash, live_version, threshold):
+        if random.random() >= self.sample_rate:
+            return False
+        if x.shape[1:3] != self.candidate.target_size:
+            with self._lock:
+                self.skipped += 1
+            return False
+        try:
+            self._queue.put_nowait((x, live_score, live_seconds, image_hash, live_version, threshold))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _score(self, x, live_score, live_seconds, image_hash, live_version, threshold):
+        start = time.perf_counter()
+        shadow_score = float(self.candidate.model.predict(x, verbose=0)[0][0])
+        shadow_seconds = time.perf_counter() - start
+        delta = shadow_score - live_score
+        flipped = (shadow_score >= threshold) != (live_score >= threshold)
+        with self._lock:
+            self.scored += 1
+            self.disagreements += int(flipped)
+            self._abs_delta_sum += abs(delta)
+            self._live_seconds_sum += live_seconds
+            self._shadow_seconds_sum += shadow_seconds
+        record = {
+            't': round(time.time(), 3),
+            'image': image_hash[:16],
+            'live_version': live_version,
+            'live': round(live_score, 5),
+            'shadow': round(shadow_score, 5),
+            'delta': round(delta, 5),
+            'threshold': threshold,
+            'flip': flipped,
+            'live_ms': round(live_seconds * 1000, 1),
+            'shadow_ms': round(shadow_seconds * 1000, 1),
+        }
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def _run(self):
+        try:
+            # Linux applies nice values per thread; keep shadow work behind live requests.
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+        except (AttributeError, OSError):
+            pass
+        while True:
+            item = self._queue.get()
+            try:
+                self._score(*item)
+            except Exception as e:
+                logging.error(f"Shadow scoring failed: {e}")
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self._thread.start()
+
+    def snapshot(self):
+        with self._lock:
+            scored = self.scored
+            return {
+                'sample_rate': self.sample_rate,
+                'queue_depth': self._queue.qsize(),
+                'submitted': self.submitted,
+                'dropped': self.dropped,
+                'skipped_shape': self.skipped,
+                'scored': scored,
+                'disagreements': self.disagreements,
+                'mean_abs_delta': round(self._abs_delta_sum / scored, 5) if scored else None,
+                'mean_live_ms': round(self._live_seconds_sum / scored * 1000, 1) if scored else None,
+                'mean_shadow_ms': round(self._shadow_seconds_sum / scored * 1000, 1) if scored else None,
+            }
@@ -0,0 +1,86 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+FULL = 'full'
+FAST = 'fast'
+
+
+class Tier:
+    """A servable model together with the input size it expects."""
+
+    def __init__(self, name, model, target_size):
+        self.name = name
+        self.model = model
+        self.target_size = target_size
+
+
+class TierSelector:
+    """Chooses between the full and fast tiers based on recent load.
+
+    The selector degrades to the fast tier when the queue depth or the recent
+    p95 latency crosses its high-water mark, and returns to the full tier only
+    once both are back under their low-water marks and the current tier has
+    been held for at least ``min_dwell`` seconds. The gap between the marks and
+    the dwell time keep it from flapping at the boundary.
+    """
+
+    def __init__(self, high_queue_depth=4, low_queue_depth=1, high_latency=2.0, low_latency=0.8, window=50, min_dwell=5.0):
+        self.high_queue_depth = high_queue_depth
+        self.low_queue_depth = low_queue_depth
+        self.high_latency = high_latency
+        self.low_latency = low_latency
+        self.min_dwell = min_dwell
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._current = FULL
+        self._changed_at = time.monotonic()
+
+    def observe(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _p95(self):
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def select(self, queue_depth):
+        with self._lock:
+            p95 = self._p95()
+            now = time.monotonic()
+            if now - self._changed_at < self.min_dwell:
+                return self._current
+            if self._current == FULL and (queue_depth >= self.high_queue_depth or p95 >= self.high_latency):
+                self._switch(FAST, now, queue_depth, p95)
+            elif self._current == FAST and queue_depth <= self.low_queue_depth and p95 <= self.low_latency:
+                self._switch(FULL, now, queue_depth, p95)
+            return self._current
+
+    def _switch(self, tier, now, queue_depth, p95):
+        logging.warning(f"Switching serving tier {self._current} -> {tier} (queue depth {queue_depth}, p95 {p95:.3f}s)")
+        self._current = tier
+        self._changed_at = now
+        # Latencies measured on the old tier say nothing about the new one.
+        self._latencies.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'tier': self._current,
+                'p95_latency_seconds': round(self._p95(), 4),
+                'samples': len(self._latencies),
+            }
+
+
+def selector_from_env():
+    return TierSelector(
+        high_queue_depth=int(os.environ.get('QOS_HIGH_QUEUE_DEPTH', 4)),
+        low_queue_depth=int(os.environ.get('QOS_LOW_QUEUE_DEPTH', 1)),
+        high_latency=float(os.environ.get('QOS_HIGH_LATENCY_SECONDS', 2.0)),
+        low_latency=float(os.environ.get('QOS_LOW_LATENCY_SECONDS', 0.8)),
+        min_dwell=float(os.environ.get('QOS_MIN_DWELL_SECONDS', 5.0)),
+    )
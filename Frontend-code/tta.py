@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+
+def augment_views(x, shift=0.05, crop=0.9):
+    """Build the augmented views of a (1, H, W, C) batch as one (N, H, W, C) array.
+
+    The views are a horizontal flip, four edge-padded shifts of ``shift`` of
+    the image size, and a centre crop of ``crop`` resized back with
+    nearest-neighbour indexing. The identity view is left out because the
+    caller already has its score.
+    """
+    img = x[0]
+    height, width = img.shape[:2]
+    dy, dx = max(1, round(height * shift)), max(1, round(width * shift))
+    padded = np.pad(img, ((dy, dy), (dx, dx), (0, 0)), mode='edge')
+
+    crop_h, crop_w = max(1, int(height * crop)), max(1, int(width * crop))
+    top, left = (height - crop_h) // 2, (width - crop_w) // 2
+    rows = top + np.arange(height) * crop_h // height
+    cols = left + np.arange(width) * crop_w // width
+
+    views = [img[:, ::-1]]
+    for oy, ox in ((0, dx), (2 * dy, dx), (dy, 0), (dy, 2 * dx)):
+        views.append(padded[oy:oy + height, ox:ox + width])
+    views.append(img[rows[:, None], cols[None, :]])
+    return np.stack(views)
+
+
+class TestTimeAugmentation:
+    """Averages augmented views for scores that sit close to a decision threshold."""
+
+    def __init__(self, margin=0.05, shift=0.05, crop=0.9):
+        self.margin = margin
+        self.shift = shift
+        self.crop = crop
+
+    def is_borderline(self, score, thresholds):
+        return any(abs(score - threshold) <= self.margin for threshold in thresholds)
+
+    def refine(self, model, x, score):
+        """Average ``score`` (the identity view) with one batched pass over the other views."""
+        views = augment_views(x, self.shift, self.crop)
+        scores = model.predict(views, batch_size=len(views), verbose=0)[:, 0]
+        return float((score + scores.sum()) / (len(scores) + 1)), len(scores) + 1
+
+
+def tta_from_env():
+    if os.environ.get('TTA_ENABLED') != '1':
+        return None
+    return TestTimeAugmentation(
+        margin=float(os.environ.get('TTA_MARGIN', 0.05)),
+        shift=float(os.environ.get('TTA_SHIFT', 0.05)),
+        crop=float(os.environ.get('TTA_CROP', 0.9)),
+    )
@@ -0,0 +1,19 @@
+#!/bin/sh
+
+# Exit immediately if a command exits with a non-zero status.
+set -e
+
+# The Vercel bundle leaves out models/**/*.h5 (see .vercelignore), and
+# serverless.py loads the flat export instead. The @vercel/python build only
+# installs requirements, so the export is written here, from the .h5 on this
+# machine, right before the upload.
+MODEL_H5="${MODEL_H5:-models/pneu_cnn_model.h5}"
+
+echo "Exporting $MODEL_H5 to the flat weight format..."
+cd "$(dirname "$0")/Frontend-code"
+python export_weights.py "$MODEL_H5"
+cd ..
+
+# Any arguments, such as --prod, are passed on to the Vercel CLI.
+echo "Deploying to Vercel..."
+exec vercel deploy "$@"